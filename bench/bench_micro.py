@@ -0,0 +1,124 @@
+"""
+Microbenchmarks for the CPU-bound stages, on synthetic inputs (no network, no API keys).
+
+    python bench/bench_micro.py                  # extraction and mixing
+    python bench/bench_micro.py mixing --minutes 30
+
+extraction  parses synthetic PDFs and text files through doc_extract's process pool, cold
+            (empty cache) and warm (cache hits), and reports pages/s.
+mixing      lays out a synthetic episode of speech-like lines over a music bed and times
+            build_timeline, one render pass, loudness measurement and MP3 export, as seconds
+            and multiples of real time.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+def timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+# ================= EXTRACTION =================
+
+def make_pdf(pages, lines_per_page=40, seed=0):
+    """A minimal valid PDF with lines_per_page lines of Helvetica text on every page."""
+    rng = np.random.default_rng(seed)
+    vocab = "revenue growth market quarter analysts forecast region product margin demand supply policy".split()
+    objs = ["<< /Type /Catalog /Pages 2 0 R >>",
+            f"<< /Type /Pages /Kids [{' '.join(f'{3 + 2 * i} 0 R' for i in range(pages))}] /Count {pages} "
+            "/Resources << /Font << /F1 << /Type /Font /Subtype /Type1 /BaseFont /Helvetica >> >> >> >>"]
+    for i in range(pages):
+        text = " ".join(f"({' '.join(rng.choice(vocab, 12))}) Tj T*" for _ in range(lines_per_page))
+        stream = f"BT /F1 10 Tf 12 TL 54 740 Td {text} ET"
+        objs.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + 2 * i} 0 R >>")
+        objs.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+    out, offsets = "%PDF-1.4\n", []
+    for n, obj in enumerate(objs, 1):
+        offsets.append(len(out))
+        out += f"{n} 0 obj\n{obj}\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objs) + 1}\n0000000000 65535 f \n" + "".join(f"{o:010d} 00000 n \n" for o in offsets)
+    out += f"trailer\n<< /Size {len(objs) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+    return out.encode("latin-1")
+
+def bench_extraction(args):
+    from doc_extract import iter_document_text, get_pool
+    docs = [(i, f"doc{i}.pdf", make_pdf(args.pages, seed=i)) for i in range(args.pdfs)]
+    docs += [(len(docs) + i, f"notes{i}.txt", ("lorem ipsum dolor sit amet " * 40000).encode()) for i in range(2)]
+    pages = args.pdfs * args.pages
+    with tempfile.TemporaryDirectory() as cache:
+        _, pool_s = timed(lambda: list(get_pool().map(abs, range(os.cpu_count() or 2))))  # spawn the workers
+        _, cold_s = timed(lambda: list(iter_document_text(docs, cache)))
+        _, warm_s = timed(lambda: list(iter_document_text(docs, cache)))
+    return {
+        "documents": len(docs), "pdf_pages": pages, "mb": round(sum(len(d) for _, _, d in docs) / 1e6, 1),
+        "pool_start_s": round(pool_s, 3), "cold_s": round(cold_s, 3), "cold_pages_per_s": round(pages / cold_s, 1),
+        "warm_s": round(warm_s, 3),
+    }
+
+# ================= MIXING =================
+
+def speech_like(seconds, rng):
+    """Mono float32: a voiced tone with syllable-rate envelope and pauses."""
+    from podcast_pipeline import MIX_RATE
+    t = np.arange(int(seconds * MIX_RATE), dtype=np.float32) / MIX_RATE
+    envelope = np.clip(np.sin(2 * np.pi * rng.uniform(3, 5) * t), 0, None) * (rng.random(len(t)) > 0.0005)
+    return (0.25 * np.sin(2 * np.pi * rng.uniform(110, 220) * t) * envelope).astype(np.float32).reshape(-1, 1)
+
+def bench_mixing(args):
+    from podcast_pipeline import MIX_RATE, build_timeline, iter_rendered, measure_gain, export_mp3, phone_filter
+    rng = np.random.default_rng(0)
+    voices, total = [], 0.0
+    while total < args.minutes * 60:
+        seconds = float(rng.uniform(4, 14))
+        voices.append(speech_like(seconds, rng))
+        total += seconds + 0.35
+    bed = (0.1 * rng.standard_normal((MIX_RATE * 45, 2))).astype(np.float32)
+    phone_filter(voices[0][:MIX_RATE])  # import SciPy outside the timing
+    _, filter_s = timed(lambda: [phone_filter(v) for v in voices[:10]])
+    timeline, layout_s = timed(build_timeline, voices, bed=bed, lead_in_ms=5000, bed_gain_db=-12, duck_db=-10)
+    _, render_s = timed(lambda: sum(len(block) for block in iter_rendered(timeline)))
+    _, loudness_s = timed(measure_gain, timeline)
+    with tempfile.TemporaryDirectory() as tmp:
+        _, export_s = timed(export_mp3, timeline, Path(tmp) / "bench.mp3", normalize=True)
+    audio_s = timeline["length"] / MIX_RATE
+    return {
+        "lines": len(voices), "audio_s": round(audio_s, 1), "phone_filter_10_lines_s": round(filter_s, 3),
+        "build_timeline_s": round(layout_s, 3),
+        "render_s": round(render_s, 3), "render_x_realtime": round(audio_s / render_s, 1),
+        "loudness_s": round(loudness_s, 3), "loudness_x_realtime": round(audio_s / loudness_s, 1),
+        "export_mp3_s": round(export_s, 3), "export_x_realtime": round(audio_s / export_s, 1),
+    }
+
+BENCHMARKS = {"extraction": bench_extraction, "mixing": bench_mixing}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="PodcastLM microbenchmarks on synthetic data.")
+    parser.add_argument("benchmarks", nargs="*", metavar="{extraction,mixing}", help="benchmarks to run (default: all)")
+    parser.add_argument("--pdfs", type=int, default=4, help="synthetic PDFs for extraction")
+    parser.add_argument("--pages", type=int, default=120, help="pages per synthetic PDF")
+    parser.add_argument("--minutes", type=float, default=15, help="episode length for mixing")
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args(argv)
+    if unknown := set(args.benchmarks) - set(BENCHMARKS): parser.error(f"unknown benchmark: {', '.join(sorted(unknown))}")
+
+    results = {}
+    for name in args.benchmarks or sorted(BENCHMARKS):
+        results[name] = BENCHMARKS[name](args)
+        print(f"{name}:")
+        for k, v in results[name].items(): print(f"  {k:<26}{v}")
+    if args.json: Path(args.json).write_text(json.dumps(results, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+"""
+End-to-end pipeline benchmark against the local fake OpenAI server (no network, no API keys).
+
+    python bench/bench_pipeline.py                       # every length option
+    python bench/bench_pipeline.py --lengths "Short (2 min)" --latency 0.5 --rpm 120
+
+For each length option a fresh process writes a script (streamed, like the Studio) and produces
+the episode progressively with a cold segment cache, and reports:
+    lines/s       dialogue lines recorded per second of production
+    first audio   seconds from Start Production to the first playable part
+    mix           seconds from the last recorded line to the finished MP3
+    peak RSS      peak resident memory of the run (ffmpeg children excluded)
+Per-run Chrome traces (see podcast_pipeline.Trace) are written to --out.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from fake_openai import start_server, add_config_args, config_from_args, words
+
+LENGTHS = ["Short (2 min)", "Medium (5 min)", "Long (15 min)", "Extra Long (30 min)"]
+
+def peak_rss_mb():
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    except ImportError:
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+        except Exception: return None
+
+def run_one(length, base_url, out_dir, tts_workers, source_chars):
+    """One measured run in this process; PODCASTLM_CACHE_DIR must already point at an empty directory."""
+    from podcast_pipeline import (get_openai_client, write_script, produce_episode, stream_text, iter_script_events,
+                                  Trace, tracing)
+    client = get_openai_client("bench", base_url)
+    settings = {"length_option": length, "caller_prompt": "What should listeners do next?", "tts_workers": tts_workers,
+                "progressive": True, "normalize": True, "duck_music": True}
+    source = words(source_chars // 6, "bench-source")
+    marks = {}
+
+    def streamed(messages):
+        for kind, value in iter_script_events(stream_text(client, "fake-model", messages, use_cache=False)):
+            if kind == "line": marks.setdefault("first_line", time.perf_counter())
+            if kind == "done": return value
+
+    def on_progress(done, total, stats):
+        marks["last_line"] = time.perf_counter()
+
+    def on_chapter(k, path, start_s, end_s):
+        marks.setdefault("first_audio", time.perf_counter())
+        marks["audio_s"] = end_s
+
+    trace = Trace(length)
+    with tracing(trace):
+        t0 = time.perf_counter()
+        script = write_script(client, "fake-model", source, settings, use_cache=False, complete=streamed)
+        t1 = time.perf_counter()
+        episode, stats = produce_episode(client, script["dialogue"], settings, Path(out_dir) / "episode", on_progress, on_chapter)
+        t2 = time.perf_counter()
+    (Path(out_dir) / "trace.json").write_text(trace.to_chrome_trace(), encoding="utf-8")
+
+    lines = stats["hits"] + stats["misses"]
+    return {
+        "length": length,
+        "lines": lines,
+        "audio_s": round(marks.get("audio_s", 0), 1),
+        "script_s": round(t1 - t0, 2),
+        "first_line_s": round(marks["first_line"] - t0, 2) if "first_line" in marks else None,
+        "lines_per_s": round(lines / (marks["last_line"] - t1), 2) if lines else 0,
+        "first_audio_s": round(marks["first_audio"] - t1, 2) if "first_audio" in marks else None,
+        "mix_s": round(t2 - marks["last_line"], 2) if lines else None,
+        "total_s": round(t2 - t0, 2),
+        "peak_rss_mb": round(peak_rss_mb() or 0, 1),
+        "mp3": str(episode) if episode else None,
+    }
+
+def print_table(rows):
+    cols = [("length", "length", 20), ("lines", "lines", 6), ("audio_s", "audio s", 8), ("script_s", "script s", 9),
+            ("lines_per_s", "lines/s", 8), ("first_audio_s", "first audio", 12), ("mix_s", "mix s", 7),
+            ("total_s", "total s", 8), ("peak_rss_mb", "peak RSS MB", 12)]
+    print("".join(f"{title:>{w}}" if key != "length" else f"{title:<{w}}" for key, title, w in cols))
+    for row in rows:
+        print("".join(f"{str(row.get(key)):>{w}}" if key != "length" else f"{str(row.get(key)):<{w}}" for key, _, w in cols))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark of the PodcastLM pipeline.")
+    parser.add_argument("--lengths", nargs="+", default=LENGTHS, choices=LENGTHS, metavar="LENGTH", help="length options to run")
+    parser.add_argument("--tts-workers", type=int, default=4)
+    parser.add_argument("--source-chars", type=int, default=20000, help="size of the synthetic source text")
+    parser.add_argument("--out", default="bench_results", help="directory for traces, episodes and results.json")
+    parser.add_argument("--one", help=argparse.SUPPRESS)       # internal: run one length in this process
+    parser.add_argument("--base-url", help=argparse.SUPPRESS)
+    add_config_args(parser)
+    args = parser.parse_args(argv)
+
+    if args.one:
+        print(json.dumps(run_one(args.one, args.base_url, args.out, args.tts_workers, args.source_chars)))
+        return 0
+
+    server, base_url = start_server(**config_from_args(args))
+    out_root = Path(args.out)
+    rows = []
+    for length in args.lengths:
+        run_dir = out_root / length.split()[0].lower()
+        run_dir.mkdir(parents=True, exist_ok=True)
+        with tempfile.TemporaryDirectory() as cache:
+            # A fresh process per run: cold caches, and peak RSS that belongs to this run alone.
+            env = {**os.environ, "PODCASTLM_CACHE_DIR": cache}
+            cmd = [sys.executable, __file__, "--one", length, "--base-url", base_url, "--out", str(run_dir),
+                   "--tts-workers", str(args.tts_workers), "--source-chars", str(args.source_chars)]
+            proc = subprocess.run(cmd, env=env, capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(f"{length}: failed\n{proc.stderr}", file=sys.stderr)
+            continue
+        rows.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+        print(f"{length}: {rows[-1]['lines']} lines in {rows[-1]['total_s']}s", file=sys.stderr)
+    server.shutdown()
+
+    print_table(rows)
+    print(f"\nfake server requests: {server.stats}")
+    (out_root / "results.json").write_text(json.dumps({"config": config_from_args(args), "runs": rows, "requests": server.stats}, indent=2))
+    return 0 if len(rows) == len(args.lengths) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+"""
+Local stand-in for the OpenAI-compatible endpoints PodcastLM uses, for offline benchmarks.
+
+    python bench/fake_openai.py --port 8765 --latency 0.3 --rpm 300
+
+Point a client at http://127.0.0.1:8765/v1 with any API key. Serves chat.completions (plain,
+JSON mode and SSE streaming), audio.speech (synthetic MP3, length proportional to the input),
+audio.transcriptions and embeddings. Every request waits --latency (+/- --jitter) seconds;
+--rpm enforces a per-endpoint requests-per-minute limit answered with 429 and Retry-After,
+like the real API. Responses are deterministic, so repeated runs do the same work.
+"""
+import re
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+import subprocess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+from pydub import AudioSegment  # only for the ffmpeg path pydub resolved
+
+SPEECH_RATE = 24000
+CHARS_PER_SECOND = 15  # roughly tts-1 at speed 1.0
+EMBEDDING_DIM = 256
+WORDS = ("the market data shows a clear trend in quarterly revenue while analysts debate what "
+         "drives growth across regions and which products matter most for the coming year").split()
+
+DEFAULT_CONFIG = {
+    "latency": 0.2,          # seconds before every response
+    "jitter": 0.05,          # +/- uniform seconds added to latency
+    "tokens_per_sec": 400,   # streamed chat completion speed
+    "tts_rtf": 0.05,         # extra seconds of speech latency per second of audio
+    "rpm": 0,                # requests per minute per endpoint, 0 = unlimited
+}
+
+# ================= SYNTHETIC CONTENT =================
+
+def words(n, seed):
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) for _ in range(n))
+
+def requested_exchanges(messages):
+    """The exchange count the prompt asks for ("Length: 30 exchanges", "12-15 exchanges")."""
+    m = re.findall(r"(\d+)(?:-(\d+))? exchanges", " ".join(m["content"] for m in messages))
+    if not m: return 12
+    low, high = m[-1]
+    return int(high or low)
+
+def chat_content(body):
+    messages = body.get("messages", [])
+    seed = hashlib.sha256(json.dumps(messages).encode()).hexdigest()
+    json_mode = (body.get("response_format") or {}).get("type") == "json_object"
+    if not json_mode: return words(250, seed)
+    rng = random.Random(seed)
+    dialogue = [{"speaker": "Host 1" if i % 2 == 0 else "Host 2", "text": words(rng.randint(12, 45), f"{seed}{i}") + "."}
+                for i in range(requested_exchanges(messages))]
+    if "Caller" in messages[-1]["content"]:
+        dialogue.insert(len(dialogue) * 2 // 3, {"speaker": "Caller", "text": words(20, seed) + "?"})
+    return json.dumps({"title": "Benchmark Episode", "dialogue": dialogue})
+
+_clips, _clips_lock = {}, threading.Lock()
+
+def speech_mp3(text):
+    """MP3 of a quiet tone as long as text would take to say; encoded once per half-second bucket."""
+    seconds = max(0.5, round(len(text) / CHARS_PER_SECOND * 2) / 2)
+    with _clips_lock:
+        if seconds not in _clips:
+            t = np.arange(int(seconds * SPEECH_RATE)) / SPEECH_RATE
+            pcm = (np.sin(2 * np.pi * 180 * t) * (0.5 + 0.5 * np.sin(2 * np.pi * 3 * t)) * 6000).astype(np.int16)
+            cmd = [AudioSegment.converter, "-nostdin", "-loglevel", "error", "-f", "s16le", "-ar", str(SPEECH_RATE), "-ac", "1",
+                   "-i", "-", "-b:a", "64k", "-f", "mp3", "-"]
+            _clips[seconds] = subprocess.run(cmd, input=pcm.tobytes(), capture_output=True, check=True).stdout
+        return _clips[seconds], seconds
+
+def embedding(text):
+    v = np.random.default_rng(int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")).standard_normal(EMBEDDING_DIM)
+    return (v / np.linalg.norm(v)).round(6).tolist()
+
+# ================= SERVER =================
+
+class RateLimiter:
+    """Sliding one-minute window per endpoint."""
+    def __init__(self, rpm):
+        self.rpm = rpm
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def retry_after(self, endpoint):
+        """0 if the request may proceed, else seconds until it may."""
+        if not self.rpm: return 0
+        now = time.monotonic()
+        with self.lock:
+            calls = [t for t in self.calls.get(endpoint, []) if now - t < 60]
+            self.calls[endpoint] = calls
+            if len(calls) >= self.rpm: return max(0.05, 60 - (now - calls[0]))
+            calls.append(now)
+            return 0
+
+class FakeServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # clients dropping keep-alive connections when they exit are expected
+        if not isinstance(sys.exc_info()[1], ConnectionError): super().handle_error(request, client_address)
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args): pass
+
+    def send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items(): self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        config, stats = self.server.config, self.server.stats
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        endpoint = self.path.split("?")[0].removeprefix("/v1")
+        with self.server.lock: stats[endpoint] = stats.get(endpoint, 0) + 1
+
+        if wait := self.server.limiter.retry_after(endpoint):
+            with self.server.lock: stats["429"] = stats.get("429", 0) + 1
+            return self.send_json(429, {"error": {"message": "Rate limit reached (fake server).", "type": "requests", "code": "rate_limit_exceeded"}},
+                                  {"Retry-After": f"{wait:.2f}", "retry-after-ms": str(int(wait * 1000))})
+        time.sleep(max(0.0, config["latency"] + random.uniform(-config["jitter"], config["jitter"])))
+
+        if endpoint == "/chat/completions": return self.chat(json.loads(body))
+        if endpoint == "/audio/speech":
+            audio, seconds = speech_mp3(json.loads(body).get("input", ""))
+            time.sleep(seconds * config["tts_rtf"])
+            self.send_response(200)
+            self.send_header("Content-Type", "audio/mpeg")
+            self.send_header("Content-Length", str(len(audio)))
+            self.end_headers()
+            return self.wfile.write(audio)
+        if endpoint == "/audio/transcriptions":
+            # ~32 kbit/s uploads: one word per 2.5 KB is about normal speech
+            return self.send_json(200, {"text": words(max(1, len(body) // 2500), hashlib.sha256(body[:4096]).hexdigest())})
+        if endpoint == "/embeddings":
+            inputs = json.loads(body)["input"]
+            inputs = [inputs] if isinstance(inputs, str) else inputs
+            return self.send_json(200, {"object": "list", "model": "fake-embedding",
+                                        "data": [{"object": "embedding", "index": i, "embedding": embedding(t)} for i, t in enumerate(inputs)],
+                                        "usage": {"prompt_tokens": 0, "total_tokens": 0}})
+        self.send_json(404, {"error": {"message": f"Unknown endpoint {self.path}"}})
+
+    def chat(self, body):
+        content, model, created = chat_content(body), body.get("model", "fake"), int(time.time())
+        base = {"id": "chatcmpl-fake", "created": created, "model": model}
+        if not body.get("stream"):
+            return self.send_json(200, {**base, "object": "chat.completion", "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+                                        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}]})
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        def send(payload):
+            data = f"data: {payload}\n\n".encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+        pieces = re.findall(r"\S+\s*|\s+", content)  # about one token per word
+        step = 8
+        for k in range(0, len(pieces), step):
+            delta = "".join(pieces[k:k + step])
+            send(json.dumps({**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": {"content": delta}, "finish_reason": None}]}))
+            time.sleep(step / self.server.config["tokens_per_sec"])
+        send(json.dumps({**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}))
+        send("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+
+def start_server(port=0, **config):
+    """Starts the server on a background thread. Returns (server, base_url); server.stats counts requests."""
+    server = FakeServer(("127.0.0.1", port), Handler)
+    server.config = {**DEFAULT_CONFIG, **config}
+    server.stats, server.lock = {}, threading.Lock()
+    server.limiter = RateLimiter(server.config["rpm"])
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+def add_config_args(parser):
+    parser.add_argument("--latency", type=float, default=DEFAULT_CONFIG["latency"], help="seconds before every response")
+    parser.add_argument("--jitter", type=float, default=DEFAULT_CONFIG["jitter"], help="+/- seconds of random latency")
+    parser.add_argument("--tokens-per-sec", type=float, default=DEFAULT_CONFIG["tokens_per_sec"], help="streamed chat speed")
+    parser.add_argument("--tts-rtf", type=float, default=DEFAULT_CONFIG["tts_rtf"], help="extra speech latency per second of audio")
+    parser.add_argument("--rpm", type=int, default=DEFAULT_CONFIG["rpm"], help="requests per minute per endpoint (0 = unlimited)")
+
+def config_from_args(args):
+    return {"latency": args.latency, "jitter": args.jitter, "tokens_per_sec": args.tokens_per_sec, "tts_rtf": args.tts_rtf, "rpm": args.rpm}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible server for offline benchmarks.")
+    parser.add_argument("--port", type=int, default=8765)
+    add_config_args(parser)
+    args = parser.parse_args()
+    server, url = start_server(args.port, **config_from_args(args))
+    print(f"Serving fake OpenAI API at {url} (Ctrl+C to stop)")
+    try:
+        while True: time.sleep(3600)
+    except KeyboardInterrupt: server.shutdown()
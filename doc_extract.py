@@ -0,0 +1,136 @@
+"""
+Document text extraction for PodcastLM Studio, run on a process pool.
+
+Kept out of podcast_cloud.py because Streamlit executes the app as __main__, and
+spawn-based process pools cannot import worker functions from there.
+Parsers are imported inside the workers so the app itself never pays for them.
+"""
+import io
+import os
+import hashlib
+import threading
+import multiprocessing
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+EXTRACT_VERSION = 1  # bump when extraction output changes, to invalidate cached text
+DOCUMENT_TYPES = (".pdf", ".docx", ".pptx", ".txt")
+PDF_PAGES_PER_TASK = 8
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """One shared pool per server process. Spawned (not forked) because the Streamlit server is threaded."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=min(os.cpu_count() or 2, 8), mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+def reset_pool(broken):
+    """Drops a pool that lost a worker (e.g. to the OOM killer), so the next get_pool() starts a fresh one."""
+    global _pool
+    with _pool_lock:
+        if _pool is broken: _pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+def submit(tasks, retry=True):
+    """(pool, futures) for tasks on the shared pool, replacing the pool once if it turns out to be broken."""
+    pool = get_pool()
+    try: return pool, [pool.submit(fn, *args) for fn, args in tasks]
+    except BrokenProcessPool:
+        reset_pool(pool)
+        if not retry: raise
+        return submit(tasks, retry=False)
+
+# ================= WORKERS =================
+
+def extract_pdf_pages(data, start, stop):
+    import PyPDF2
+    reader = PyPDF2.PdfReader(io.BytesIO(data))
+    return "".join((reader.pages[i].extract_text() or "") + "\n" for i in range(start, stop))
+
+def extract_docx(data):
+    import docx
+    return "".join(para.text + "\n" for para in docx.Document(io.BytesIO(data)).paragraphs)
+
+def extract_pptx(data):
+    from pptx import Presentation
+    return "".join(shape.text + "\n" for slide in Presentation(io.BytesIO(data)).slides
+                   for shape in slide.shapes if hasattr(shape, "text"))
+
+def extract_txt(data):
+    return data.decode("utf-8") + "\n"
+
+def pdf_page_count(data):
+    import PyPDF2
+    return len(PyPDF2.PdfReader(io.BytesIO(data)).pages)
+
+# ================= DRIVER =================
+
+def cache_path(data, cache_dir):
+    digest = hashlib.sha256(data).hexdigest()
+    return Path(cache_dir) / f"{digest}-v{EXTRACT_VERSION}.txt"
+
+def _tasks(name, data):
+    """(fn, args) jobs for one document; PDFs are split into page ranges."""
+    ext = os.path.splitext(name.lower())[1]
+    if ext == ".pdf":
+        pages = pdf_page_count(data)
+        return [(extract_pdf_pages, (data, a, min(a + PDF_PAGES_PER_TASK, pages))) for a in range(0, pages, PDF_PAGES_PER_TASK)]
+    if ext == ".docx": return [(extract_docx, (data,))]
+    if ext == ".pptx": return [(extract_pptx, (data,))]
+    return [(extract_txt, (data,))]
+
+def iter_document_text(docs, cache_dir):
+    """
+    Extracts text from docs, a list of (key, name, bytes), with every file and PDF page
+    range running in parallel on the shared pool.
+    Yields (key, piece, error) in document order; cached files yield a single piece with
+    no pool work. A file's text is cached by content hash only if it extracted cleanly.
+    If a worker dies, the pool is replaced and each affected file's remaining work is resubmitted once.
+    cache_dir=None extracts without the cache.
+    """
+    from podcast_pipeline import write_atomic  # not at module level: the pipeline imports this module
+    jobs = []
+    for key, name, data in docs:
+        path = cache_path(data, cache_dir) if cache_dir is not None else None
+        if path is not None and path.exists():
+            jobs.append((key, path, None, None, None, None))
+            continue
+        try:
+            tasks = _tasks(name, data)
+            jobs.append((key, path, tasks, *submit(tasks), None))
+        except Exception as e: jobs.append((key, path, None, None, None, e))
+
+    for key, path, tasks, pool, futures, error in jobs:
+        if error is not None:
+            yield key, None, error
+        elif futures is None:
+            os.utime(path)
+            yield key, path.read_text(encoding="utf-8"), None
+        else:
+            pieces, retried = [], False
+            while len(pieces) < len(futures):
+                try: pieces.append(futures[len(pieces)].result())
+                except BrokenProcessPool as e:
+                    reset_pool(pool)
+                    if not retried:
+                        retried = True
+                        try:
+                            pool, rest = submit(tasks[len(pieces):])
+                            futures = futures[:len(pieces)] + rest
+                            continue
+                        except BrokenProcessPool as again: e = again
+                    yield key, None, e
+                    break
+                except Exception as e:
+                    for rest in futures: rest.cancel()
+                    yield key, None, e
+                    break
+                yield key, pieces[-1], None
+            else:
+                if path is None: continue
+                with write_atomic(path) as tmp: tmp.write_text("".join(pieces), encoding="utf-8")
@@ -0,0 +1,127 @@
+"""
+Batch episode production without the Studio UI.
+
+    python podcast_batch.py jobs.jsonl --out episodes --workers 4
+
+Each line of the jobs file is a JSON object:
+    {"id": "ep01", "source": {"url": "https://..."}, "settings": {"length_option": "Long (15 min)"}}
+source is {"text"}, {"url"}, {"urls": [...]}, {"video"} or {"files": [paths]}; settings override
+podcast_pipeline.DEFAULT_SETTINGS. Keys come from OPENAI_API_KEY and XAI_API_KEY.
+
+Every job keeps its stages in <out>/<id>/ (source.txt, script.json, podcast.mp3), so an
+interrupted run picks up where it stopped: finished stages and finished jobs are skipped.
+Stage timings of the last run go to <out>/<id>/trace.json, and a summary of every
+job's state is kept in <out>/jobs.json.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import traceback
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from podcast_pipeline import get_openai_client, get_llm_client, load_source, write_script, produce_episode, write_atomic, Trace, tracing
+
+PROVIDERS = {"openai": "Model A (OpenAI)", "xai": "Model B (xAI Grok)"}
+
+def write_text(path, text):
+    with write_atomic(path) as tmp: tmp.write_text(text, encoding="utf-8")
+
+class JobState:
+    """jobs.json: {id: {"status", "stage", "error", "seconds"}}, rewritten on every change."""
+    def __init__(self, path):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.jobs = json.loads(self.path.read_text(encoding="utf-8")) if self.path.exists() else {}
+
+    def update(self, job_id, **fields):
+        with self.lock:
+            self.jobs.setdefault(job_id, {}).update(fields)
+            write_text(self.path, json.dumps(self.jobs, indent=2))
+
+def load_jobs(path):
+    jobs = []
+    for n, line in enumerate(Path(path).read_text(encoding="utf-8").splitlines(), 1):
+        if not line.strip(): continue
+        job = json.loads(line)
+        job.setdefault("id", f"job{n:03d}")
+        jobs.append(job)
+    ids = [job["id"] for job in jobs]
+    if len(set(ids)) != len(ids): raise ValueError("Job ids must be unique.")
+    return jobs
+
+def run_job(job, out_dir, args, state):
+    """Runs a job's unfinished stages; its timings are saved as <out>/<id>/trace.json (Chrome trace format)."""
+    job_dir = out_dir / job["id"]
+    job_dir.mkdir(parents=True, exist_ok=True)
+    trace = Trace(job["id"])
+    try:
+        with tracing(trace): run_stages(job, job_dir, args, state)
+    finally: write_text(job_dir / "trace.json", trace.to_chrome_trace())
+
+def run_stages(job, job_dir, args, state):
+    settings = {**job.get("settings", {}), "progressive": False}
+    openai_key, xai_key = os.environ.get("OPENAI_API_KEY"), os.environ.get("XAI_API_KEY")
+    audio_client = get_openai_client(openai_key) if openai_key else None
+    started = time.perf_counter()
+
+    source_path = job_dir / "source.txt"
+    if not source_path.exists():
+        state.update(job["id"], status="running", stage="source")
+        write_text(source_path, load_source(job["source"], audio_client, lambda level, message: print(f"[{job['id']}] {message}", file=sys.stderr)))
+
+    script_path = job_dir / "script.json"
+    if not script_path.exists():
+        state.update(job["id"], status="running", stage="script")
+        llm_client, llm_model, err = get_llm_client(PROVIDERS[args.provider], args.model, openai_key, xai_key)
+        if err: raise ValueError(err)
+        script = write_script(llm_client, llm_model, source_path.read_text(encoding="utf-8"), settings, use_cache=not args.fresh)
+        write_text(script_path, json.dumps(script, ensure_ascii=False, indent=2))
+
+    if not (job_dir / "podcast.mp3").exists():
+        if not audio_client: raise ValueError("OPENAI_API_KEY is required for audio.")
+        state.update(job["id"], status="running", stage="audio")
+        script = json.loads(script_path.read_text(encoding="utf-8"))
+        episode, _ = produce_episode(audio_client, script["dialogue"], settings, job_dir)
+        if not episode: raise ValueError("No dialogue line could be recorded.")
+    state.update(job["id"], status="done", stage=None, error=None, seconds=round(time.perf_counter() - started, 1))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Produce podcast episodes from a JSONL job queue.")
+    parser.add_argument("jobs", help="JSONL file, one job per line")
+    parser.add_argument("--out", default="episodes", help="output directory (default: episodes)")
+    parser.add_argument("--workers", type=int, default=2, help="episodes produced at once (default: 2)")
+    parser.add_argument("--provider", choices=sorted(PROVIDERS), default="openai", help="script model provider")
+    parser.add_argument("--model", default="grok-2-latest", help="xAI model name (OpenAI uses gpt-4o-mini)")
+    parser.add_argument("--fresh", action="store_true", help="ignore cached LLM responses")
+    parser.add_argument("--retry-failed", action="store_true", help="also rerun jobs that failed before")
+    args = parser.parse_args(argv)
+
+    out_dir = Path(args.out)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    state = JobState(out_dir / "jobs.json")
+    jobs = [job for job in load_jobs(args.jobs)
+            if state.jobs.get(job["id"], {}).get("status") != "done"
+            and (args.retry_failed or state.jobs.get(job["id"], {}).get("status") != "failed")]
+    print(f"{len(jobs)} job(s) to run, {args.workers} at a time.")
+
+    failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        futures = {pool.submit(run_job, job, out_dir, args, state): job["id"] for job in jobs}
+        for fut in as_completed(futures):
+            job_id = futures[fut]
+            try:
+                fut.result()
+                print(f"[{job_id}] done")
+            except Exception as e:
+                failed += 1
+                state.update(job_id, status="failed", error=f"{type(e).__name__}: {e}")
+                print(f"[{job_id}] failed: {e}", file=sys.stderr)
+                traceback.print_exc()
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,24 +5,22 @@
 #
 import streamlit as st
 import os
-import tempfile
-import json
-import requests
-import shutil
-import re
-from pathlib import Path
-from pydub import AudioSegment
+import copy
+import uuid
+import hashlib
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
-# --- TEXT PROCESSING ---
-import PyPDF2
-import docx
-from pptx import Presentation
-from bs4 import BeautifulSoup
-import yt_dlp
-
-# --- AI CLIENT ---
-from openai import OpenAI
+# --- PIPELINE (extraction, scripts, TTS, mixing; see podcast_pipeline.py) ---
+from podcast_pipeline import (
+    get_openai_client, get_llm_client, iter_web_articles, article_text, extract_text_from_files, download_and_transcribe_video,
+    prune_cache, iter_merged_lines, prerender_line, build_chunk_index, embed_texts, chat_messages,
+    SCRIPT_SOURCE_LIMIT, CHAT_PREFIX_CHARS, EPISODE_DIR, EPISODE_MAX_BYTES,
+    stream_text, iter_script_events, write_script, produce_episode, VOICE_MAP, MUSIC_URLS,
+    Trace, tracing, span, carry_context, with_retries, private,
+)
+from session_store import SessionStore, SessionFull, SESSION_DB
 
 # ================= CONFIGURATION =================
 st.set_page_config(
@@ -33,16 +31,77 @@ st.set_page_config(
 )
 
 # ================= SESSION STATE =================
+# The big artifacts (source_text, script_data, chat_history, notebook_content, episode_path) are kept
+# off-heap in the session store and read with load(); session_state only holds small UI state.
+# The session id rides in the URL (?session=...), so a reload or a server restart resumes the session.
+# Nothing is stored until the user has logged in. In Privacy Mode the PRIVATE_ARTIFACTS live only in
+# session_state (memory) instead, so they never reach the disk and are not resumed.
+PRIVATE_ARTIFACTS = ("source_text", "chat_history", "notebook_content")
+
+@st.cache_resource(show_spinner=False)
+def get_session_store():
+    """One SQLite-backed store per server process (see session_store.py)."""
+    return SessionStore(SESSION_DB)
+
+store = get_session_store()
+
+def in_memory(name): return st.session_state.get("privacy_mode", False) and name in PRIVATE_ARTIFACTS
+
+def load(name, default=None):
+    if in_memory(name): return copy.deepcopy(st.session_state.private_artifacts.get(name, default))
+    return store.get(st.session_state.session_id, name, default)
+
+def save(name, value):
+    """Writes an artifact to the session store. Returns False, with an error shown, if the session is over its size limit."""
+    if in_memory(name):
+        st.session_state.private_artifacts[name] = copy.deepcopy(value)
+        return True
+    try:
+        store.put(st.session_state.session_id, name, value)
+        return True
+    except SessionFull as e:
+        st.error(f"❌ {e}")
+        return False
+
+def switch_privacy():
+    """Moves the private artifacts out of the store when Privacy Mode is switched on, and back when it is switched off."""
+    if st.session_state.privacy_mode:
+        for name in PRIVATE_ARTIFACTS:
+            value = store.get(st.session_state.session_id, name)
+            if value is not None: st.session_state.private_artifacts[name] = value
+        store.delete(st.session_state.session_id, list(PRIVATE_ARTIFACTS))
+    else:
+        for name, value in st.session_state.private_artifacts.items(): save(name, value)
+        st.session_state.private_artifacts = {}
+
+def new_notebook(): return f"# 📓 Research Notebook\n**Session Started:** {datetime.now().strftime('%Y-%m-%d %H:%M')}\n\n"
+
 if "authenticated" not in st.session_state:
     st.session_state.authenticated = False
-if "script_data" not in st.session_state:
-    st.session_state.script_data = None
-if "source_text" not in st.session_state:
-    st.session_state.source_text = ""
-if "chat_history" not in st.session_state:
-    st.session_state.chat_history = []
-if "notebook_content" not in st.session_state:
-    st.session_state.notebook_content = f"# 📓 Research Notebook\n**Session Started:** {datetime.now().strftime('%Y-%m-%d %H:%M')}\n\n"
+if "traces" not in st.session_state:
+    st.session_state.traces = []
+if "script_rev" not in st.session_state:
+    st.session_state.script_rev = 0
+if "notebook_rev" not in st.session_state:
+    st.session_state.notebook_rev = 0
+if "private_artifacts" not in st.session_state:
+    st.session_state.private_artifacts = {}
+
+def add_to_notebook(text):
+    """Appends to the notebook; a new revision gives its text area a fresh key so it shows the new content."""
+    save("notebook_content", load("notebook_content", "") + text)
+    st.session_state.notebook_rev += 1
+
+TRACE_HISTORY = 5
+
+@contextmanager
+def traced(name):
+    """Records the pipeline spans of one Studio action; the latest few are kept for the Performance Trace panel."""
+    with tracing(Trace(name)) as trace:
+        try:
+            with span(name, "studio"): yield trace
+        finally:
+            st.session_state.traces = [trace] + st.session_state.traces[:TRACE_HISTORY - 1]
 
 # ================= AUTHENTICATION =================
 def check_password():
@@ -58,105 +117,13 @@ if not st.session_state.authenticated:
     st.text_input("Enter Password", type="password", key="password_input", on_change=check_password)
     st.stop()
 
-# ================= UTILS =================
-
-def get_llm_client(model_selection, specific_model_name, openai_key, xai_key):
-    """
-    Returns client and model string.
-    """
-    if model_selection == "Model A (OpenAI)":
-        if not openai_key: return None, None, "Missing OpenAI API Key"
-        return OpenAI(api_key=openai_key), "gpt-4o-mini", None
-    
-    elif model_selection == "Model B (xAI Grok)":
-        if not xai_key: return None, None, "Missing xAI API Key"
-        return OpenAI(api_key=xai_key, base_url="https://api.x.ai/v1"), specific_model_name, None
-        
-    return None, None, "Invalid Selection"
-
-def download_file_with_headers(url, save_path):
-    try:
-        headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)'}
-        response = requests.get(url, headers=headers, stream=True, timeout=15)
-        if response.status_code == 200:
-            with open(save_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
-            return True
-        return False
-    except: return False
-
-def scrape_website(url):
-    try:
-        headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)'}
-        response = requests.get(url, headers=headers, timeout=10)
-        soup = BeautifulSoup(response.content, 'html.parser')
-        for script in soup(["script", "style", "header", "footer", "nav"]):
-            script.decompose()
-        return soup.get_text()
-    except: return None
-
-def extract_text_from_files(files, audio_client=None):
-    text = ""
-    for file in files:
-        try:
-            name = file.name.lower()
-            if name.endswith(".pdf"):
-                reader = PyPDF2.PdfReader(file)
-                for page in reader.pages: text += page.extract_text() + "\n"
-            elif name.endswith(".docx"):
-                doc = docx.Document(file)
-                for para in doc.paragraphs: text += para.text + "\n"
-            elif name.endswith(".pptx"):
-                prs = Presentation(file)
-                for slide in prs.slides:
-                    for shape in slide.shapes:
-                        if hasattr(shape, "text"): text += shape.text + "\n"
-            elif name.endswith(".txt"):
-                text = file.getvalue().decode("utf-8")
-            elif name.endswith((".mp3", ".mp4", ".wav", ".m4a", ".mpeg", ".webm")):
-                if audio_client:
-                    with st.spinner(f"Transcribing {name}..."):
-                        with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(name)[1]) as tmp_file:
-                            tmp_file.write(file.getvalue())
-                            tmp_path = tmp_file.name
-                        with open(tmp_path, "rb") as audio_file:
-                            transcript = audio_client.audio.transcriptions.create(model="whisper-1", file=audio_file)
-                        text += transcript.text + "\n"
-                        os.remove(tmp_path)
-                else:
-                    st.warning(f"Skipped {file.name}: OpenAI Key required for Audio transcription.")
-            else:
-                st.warning(f"Skipped {file.name}: Unsupported format.")
-        except Exception as e:
-            st.error(f"Error reading {file.name}: {e}")
-    return text
-
-def download_and_transcribe_video(url, audio_client):
-    try:
-        with tempfile.TemporaryDirectory() as tmp_dir:
-            ydl_opts = {
-                'format': 'bestaudio/best',
-                'outtmpl': os.path.join(tmp_dir, 'audio.%(ext)s'),
-                'postprocessors': [{'key': 'FFmpegExtractAudio','preferredcodec': 'mp3','preferredquality': '128'}],
-                'quiet': True, 'no_warnings': True, 'nocheckcertificate': True,
-                'http_headers': {'User-Agent': 'Mozilla/5.0'}
-            }
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl: ydl.download([url])
-            audio_path = os.path.join(tmp_dir, "audio.mp3")
-            if not os.path.exists(audio_path): return None, "Download failed."
-            if os.path.getsize(audio_path) / (1024*1024) > 24: return None, "Video too long (>25MB)."
-            with open(audio_path, "rb") as f:
-                transcript = audio_client.audio.transcriptions.create(model="whisper-1", file=f)
-            return transcript.text, None
-    except Exception as e: return None, str(e)
-
-def generate_audio_openai(client, text, voice, filename, speed=1.0):
-    try:
-        response = client.audio.speech.create(model="tts-1", voice=voice, input=text, speed=speed)
-        response.stream_to_file(filename)
-        return True
-    except: return False
+if "session_id" not in st.session_state:
+    resumed = st.query_params.get("session")
+    st.session_state.session_id = resumed if resumed and store.exists(resumed) else uuid.uuid4().hex
+    st.query_params["session"] = st.session_state.session_id
+    store.touch(st.session_state.session_id)
+if load("notebook_content") is None:
+    save("notebook_content", new_notebook())
 
 # ================= SIDEBAR =================
 
@@ -180,13 +147,15 @@ with st.sidebar:
             help="Select the specific Grok model version."
         )
     
-    privacy_mode = st.toggle("🛡️ Privacy Mode", value=False)
+    privacy_mode = st.toggle("🛡️ Privacy Mode", value=False, key="privacy_mode", on_change=switch_privacy,
+                             help="Sources, chat and notebook are kept in memory only: they are never written to the on-disk caches "
+                                  "or the session store, and are not resumed. The source text is dropped once the script is written.")
     
     if st.button("🗑️ New Session (Clear All)"):
-        st.session_state.chat_history = []
-        st.session_state.notebook_content = f"# 📓 Research Notebook\n**Session Started:** {datetime.now().strftime('%Y-%m-%d %H:%M')}\n\n"
-        st.session_state.source_text = ""
-        st.session_state.script_data = None
+        store.delete(st.session_state.session_id)
+        st.session_state.private_artifacts = {}
+        save("notebook_content", new_notebook())
+        st.session_state.notebook_rev += 1
         st.rerun()
         
     st.divider()
@@ -207,7 +176,6 @@ with st.sidebar:
     host2_persona = st.text_input("Host 2 Persona", "Female, enthusiastic expert, fast talker")
     
     voice_style = st.selectbox("Voice Pair", ["Dynamic (Alloy & Nova)", "Calm (Onyx & Shimmer)", "Formal (Echo & Fable)"])
-    voice_map = {"Dynamic (Alloy & Nova)": ("alloy", "nova"), "Calm (Onyx & Shimmer)": ("onyx", "shimmer"), "Formal (Echo & Fable)": ("echo", "fable")}
 
     st.divider()
     st.subheader("🎵 Music & Branding")
@@ -215,18 +183,14 @@ with st.sidebar:
     bg_source = st.radio("Background Music", ["Presets", "Upload Custom", "None"], horizontal=True)
     
     music_ramp_up = st.checkbox("🎵 Start Music 5s Before Dialogue", value=False, help="Creates a 'Cold Open' effect using the background music.")
+    duck_music = st.checkbox("🔉 Duck Music Under Speech", value=True, help="Music plays louder in pauses and dips while anyone is talking.")
+    normalize_master = st.checkbox("📏 Normalize Loudness (-16 LUFS)", value=True, help="EBU R128-style loudness normalization of the final mix.")
 
     selected_bg_url = None
     uploaded_bg_file = None
     if bg_source == "Presets":
-        music_choice = st.selectbox("Track", ["Lo-Fi (Study)", "Upbeat (Morning)", "Ambient (News)", "Cinematic (Deep)"])
-        music_urls = {
-            "Lo-Fi (Study)": "https://cdn.pixabay.com/download/audio/2022/05/27/audio_1808fbf07a.mp3?filename=lofi-study-112191.mp3",
-            "Upbeat (Morning)": "https://cdn.pixabay.com/download/audio/2024/05/24/audio_95e3f5f471.mp3?filename=good-morning-206098.mp3",
-            "Ambient (News)": "https://cdn.pixabay.com/download/audio/2022/03/10/audio_c8c8a73467.mp3?filename=ambient-piano-10226.mp3",
-            "Cinematic (Deep)": "https://cdn.pixabay.com/download/audio/2022/03/22/audio_c2b86c77ce.mp3?filename=cinematic-atmosphere-score-2-21266.mp3"
-        }
-        selected_bg_url = music_urls[music_choice]
+        music_choice = st.selectbox("Track", list(MUSIC_URLS))
+        selected_bg_url = MUSIC_URLS[music_choice]
     elif bg_source == "Upload Custom":
         uploaded_bg_file = st.file_uploader("Upload Loop (MP3/WAV)", type=["mp3", "wav"])
 
@@ -234,6 +198,128 @@ with st.sidebar:
         uploaded_intro = st.file_uploader("Intro (Plays Once)", type=["mp3", "wav"])
         uploaded_outro = st.file_uploader("Outro (Plays Once)", type=["mp3", "wav"])
 
+    st.divider()
+    st.subheader("⚡ Performance")
+    tts_workers = st.slider("Parallel TTS Requests", 1, 8, 4, help="How many dialogue lines are synthesized at once. Lower this if you hit rate limits.")
+    reuse_responses = st.checkbox("♻️ Reuse Cached AI Responses", value=True, help="Identical script requests (same source, hosts, length, language, notes) return the saved result instantly. Untick for a fresh take.")
+    semantic_search = st.checkbox("🧠 Semantic Chat Retrieval", value=False, help="Blend OpenAI embeddings into the chat's passage search. Requires an OpenAI key.")
+
+# Sidebar choices in the pipeline's terms (see podcast_pipeline.DEFAULT_SETTINGS); tab 3 adds the director notes.
+settings = {
+    "language": language, "length_option": length_option, "host1": host1_persona, "host2": host2_persona,
+    "voice_style": voice_style, "music": selected_bg_url, "music_file": uploaded_bg_file,
+    "intro_file": uploaded_intro, "outro_file": uploaded_outro, "music_ramp_up": music_ramp_up,
+    "duck_music": duck_music, "normalize": normalize_master, "tts_workers": tts_workers,
+}
+
+# ================= FRAGMENTS =================
+# Each of these reruns on its own when one of its widgets changes, instead of the whole script.
+SOURCE_PAGE_CHARS = 20000
+SCRIPT_PAGE_LINES = 20
+CHAT_VISIBLE = 20
+SOURCE_INDEXES = 8
+ROLES = ["Host 1", "Host 2", "Caller"]
+
+@st.cache_resource(max_entries=SOURCE_INDEXES, show_spinner=False)
+def get_source_index(digest, _text):
+    """Retrieval index for a source, kept per process (not per session) and shared by sessions with the same text."""
+    return build_chunk_index(_text)
+
+@st.fragment
+def source_viewer():
+    """The loaded source, one page at a time; nothing is sent to the browser until it is switched on."""
+    text = load("source_text", "")
+    if not st.toggle("👁️ View Source Text", key="show_source"): return
+    # hash() of a str is cached on the object, so this is free on reruns
+    if st.session_state.get("source_words", (None,))[0] != hash(text):
+        st.session_state.source_words = (hash(text), len(text.split()))
+    pages = -(-len(text) // SOURCE_PAGE_CHARS)
+    page = st.number_input("Page", 1, pages, 1, key=f"source_page_{hash(text)}") if pages > 1 else 1
+    st.caption(f"{len(text):,} characters · {st.session_state.source_words[1]:,} words · page {page} of {pages}")
+    st.text_area("Content", text[(page - 1) * SOURCE_PAGE_CHARS:page * SOURCE_PAGE_CHARS], height=300, disabled=True)
+
+@st.fragment
+def research_assistant():
+    """Chat and notebook. A question reruns only this fragment; the notebook below picks up the Q&A in the same pass."""
+    source_text = load("source_text", "")
+    col_chat, col_notes = st.columns([1, 1])
+    
+    with col_chat:
+        st.subheader("💬 Active Chat")
+        if not source_text:
+            st.warning("Load source text first.")
+        else:
+            history = load("chat_history", [])
+            hidden = max(0, len(history) - CHAT_VISIBLE)
+            if hidden and st.toggle(f"Show {hidden} earlier messages", key="chat_show_all"): hidden = 0
+            for message in history[hidden:]:
+                with st.chat_message(message["role"]): st.markdown(message["content"])
+            
+            index = None
+            if len(source_text) > CHAT_PREFIX_CHARS:
+                with st.spinner("Indexing source..."):
+                    index = get_source_index(hashlib.sha256(source_text.encode("utf-8")).hexdigest(), source_text)
+            embed_client = get_openai_client(openai_key) if semantic_search and openai_key else None
+            if embed_client and index is not None and index["embeddings"] is None:
+                try:
+                    with st.spinner("Embedding source..."): index["embeddings"] = embed_texts(embed_client, index["chunks"])
+                except Exception as e: st.warning(f"Semantic retrieval unavailable: {e}")
+
+            if prompt := st.chat_input("Ask a question..."):
+                # Get LLM Client (OpenAI or xAI)
+                llm_client, llm_model, err = get_llm_client(model_choice, xai_version, openai_key, xai_key)
+                
+                if err:
+                    st.error(err)
+                else:
+                    history.append({"role": "user", "content": prompt})
+                    add_to_notebook(f"**Q:** {prompt}\n\n")
+                    with st.chat_message("user"): st.markdown(prompt)
+                    
+                    with st.chat_message("assistant"), traced("Chat"), span("chat", "llm", model=llm_model) as info:
+                        messages = chat_messages(source_text, prompt, index, embed_client)
+                        stream = with_retries(lambda: llm_client.chat.completions.create(model=llm_model, messages=messages, stream=True))
+                        response = st.write_stream(stream)
+                        info["chars"] = len(response)
+                    
+                    history.append({"role": "assistant", "content": response})
+                    save("chat_history", history)
+                    add_to_notebook(f"**A:** {response}\n\n")
+
+    with col_notes:
+        st.subheader("📓 Research Notebook")
+        st.caption("Auto-saves Q&A. Editable.")
+        key = f"notebook_{st.session_state.notebook_rev}"
+        st.text_area("Notebook Content", value=load("notebook_content", ""), height=600, key=key,
+                     on_change=lambda: save("notebook_content", st.session_state[key]))
+        st.download_button("💾 Save Notebook (.md)", load("notebook_content", ""), f"notebook_{datetime.now().strftime('%Y%m%d_%H%M')}.md")
+
+def edit_line(i, field, key):
+    script = load("script_data")
+    script['dialogue'][i][field] = st.session_state[key]
+    save("script_data", script)
+
+@st.fragment
+def script_editor():
+    """The script, a page of lines at a time. Every edit is saved as it is made and reruns only this fragment."""
+    data = load("script_data")
+    dialogue = data['dialogue']
+    rev = st.session_state.script_rev
+    pages = max(1, -(-len(dialogue) // SCRIPT_PAGE_LINES))
+    col_title, col_page = st.columns([4, 1])
+    col_title.subheader(data.get('title', 'Podcast'))
+    page = col_page.number_input("Page", 1, pages, 1, key=f"script_page_{rev}") if pages > 1 else 1
+    start, stop = (page - 1) * SCRIPT_PAGE_LINES, min(page * SCRIPT_PAGE_LINES, len(dialogue))
+    st.caption(f"Lines {start + 1}–{stop} of {len(dialogue)}. Edits are saved automatically.")
+    for i in range(start, stop):
+        l = dialogue[i]
+        speaker = l.get('speaker', "Host 1")
+        roles = ROLES if speaker == "Caller" else ROLES[:2]
+        c1, c2 = st.columns([1, 5])
+        c1.selectbox("Role", roles, index=roles.index(speaker) if speaker in roles else 0, key=f"s{rev}_{i}",
+                     on_change=edit_line, args=(i, "speaker", f"s{rev}_{i}"))
+        c2.text_area("Line", l['text'], height=70, key=f"t{rev}_{i}", on_change=edit_line, args=(i, "text", f"t{rev}_{i}"))
+
 # ================= MAIN APP =================
 st.title("🎧 PodcastLM Studio")
 
@@ -246,27 +332,35 @@ with tab1:
     new_text = ""
     
     # Audio client is ALWAYS OpenAI (xAI has no audio support yet)
-    audio_client = OpenAI(api_key=openai_key) if openai_key else None
+    audio_client = get_openai_client(openai_key) if openai_key else None
 
     if input_type == "📂 Files":
         files = st.file_uploader("Upload", accept_multiple_files=True)
         if files and st.button("Process Files"):
-            with st.spinner("Processing uploaded files..."):
-                new_text = extract_text_from_files(files, audio_client)
+            with st.spinner("Processing uploaded files..."), traced("Process Files"), private(privacy_mode):
+                new_text = extract_text_from_files(files, audio_client, lambda level, message: getattr(st, level)(message))
             
     elif input_type == "🔗 Web URL":
-        url = st.text_input("Enter Article URL")
-        if url and st.button("Scrape Website"): 
-            with st.spinner("Scraping..."):
-                scraped = scrape_website(url)
-                if scraped: new_text = scraped
-                else: st.error("Blocked by website.")
+        urls = st.text_area("Enter Article URLs", placeholder="One per line. Sitemaps and RSS/Atom feeds are expanded into their articles.", height=100)
+        urls = [u.strip() for u in urls.splitlines() if u.strip()]
+        if urls and st.button("Scrape Website"): 
+            live = st.empty()
+            articles = []
+            with st.spinner("Scraping..."), traced("Scrape Website"), private(privacy_mode):
+                for url, article, err in iter_web_articles(urls):
+                    if err is not None:
+                        st.warning(f"Skipped {url}: {err}")
+                        continue
+                    articles.append(article_text(url, article))
+                    live.caption(f"📰 {len(articles)} article(s) loaded · {article['title'] or url}")
+            if articles: new_text = "".join(articles)
+            else: st.error("Blocked by website.")
                 
     elif input_type == "📺 Video URL":
         vid_url = st.text_input("Enter Video URL")
         if vid_url and st.button("Transcribe"):
             if audio_client:
-                with st.spinner("Downloading and Transcribing Video..."):
+                with st.spinner("Downloading and Transcribing Video..."), traced("Transcribe Video"):
                     text, err = download_and_transcribe_video(vid_url, audio_client)
                     if text: new_text = text
                     else: st.error(err)
@@ -276,60 +370,17 @@ with tab1:
         new_text = st.text_area("Paste Text", height=300)
 
     # Update State
-    if new_text and new_text != st.session_state.source_text:
-        st.session_state.source_text = new_text
-        st.session_state.chat_history = [] 
+    if new_text and new_text != load("source_text", "") and save("source_text", new_text):
+        save("chat_history", [])
         timestamp = datetime.now().strftime("%H:%M:%S")
-        st.session_state.notebook_content += f"\n---\n### 📥 New Source Loaded ({timestamp})\n*Source Type: {input_type}*\n\n"
+        add_to_notebook(f"\n---\n### 📥 New Source Loaded ({timestamp})\n*Source Type: {input_type}*\n\n")
         st.success("✅ Source text loaded!")
 
-    if st.session_state.source_text:
-        with st.expander("View Source Text"):
-            st.text_area("Content", st.session_state.source_text, height=150, disabled=True)
+    if load("source_text"): source_viewer()
 
 # --- TAB 2: CHAT & NOTEBOOK ---
 with tab2:
-    col_chat, col_notes = st.columns([1, 1])
-    
-    with col_chat:
-        st.subheader("💬 Active Chat")
-        if not st.session_state.source_text:
-            st.warning("Load source text first.")
-        else:
-            for message in st.session_state.chat_history:
-                with st.chat_message(message["role"]): st.markdown(message["content"])
-            
-            if prompt := st.chat_input("Ask a question..."):
-                # Get LLM Client (OpenAI or xAI)
-                llm_client, llm_model, err = get_llm_client(model_choice, xai_version, openai_key, xai_key)
-                
-                if err:
-                    st.error(err)
-                else:
-                    st.session_state.chat_history.append({"role": "user", "content": prompt})
-                    st.session_state.notebook_content += f"**Q:** {prompt}\n\n"
-                    with st.chat_message("user"): st.markdown(prompt)
-                    
-                    with st.chat_message("assistant"):
-                        stream = llm_client.chat.completions.create(
-                            model=llm_model,
-                            messages=[
-                                {"role": "system", "content": "Answer based ONLY on source text."},
-                                {"role": "user", "content": f"Source: {st.session_state.source_text[:30000]}"},
-                                {"role": "user", "content": prompt}
-                            ], stream=True)
-                        response = st.write_stream(stream)
-                    
-                    st.session_state.chat_history.append({"role": "assistant", "content": response})
-                    st.session_state.notebook_content += f"**A:** {response}\n\n"
-                    st.rerun()
-
-    with col_notes:
-        st.subheader("📓 Research Notebook")
-        st.caption("Auto-saves Q&A. Editable.")
-        updated_notebook = st.text_area("Notebook Content", value=st.session_state.notebook_content, height=600, key="notebook_area")
-        if updated_notebook != st.session_state.notebook_content: st.session_state.notebook_content = updated_notebook
-        st.download_button("💾 Save Notebook (.md)", st.session_state.notebook_content, f"notebook_{datetime.now().strftime('%Y%m%d_%H%M')}.md")
+    research_assistant()
 
 # --- TAB 3: SCRIPT ---
 with tab3:
@@ -342,8 +393,49 @@ with tab3:
         st.markdown("#### 📞 Call-in Segment")
         caller_prompt = st.text_area("Listener Question", placeholder="Type a question for a 'Caller' to ask...")
 
+    source_text = load("source_text", "")
+    full_coverage, parallel_parts = False, False
+    if len(source_text) > SCRIPT_SOURCE_LIMIT:
+        col_cov, col_par = st.columns([1, 1])
+        full_coverage = col_cov.checkbox("📚 Full-Coverage Mode", value=True, help=f"Source is {len(source_text):,} characters. Outline it section by section first instead of using only the first {SCRIPT_SOURCE_LIMIT:,}.")
+        parallel_parts = col_par.checkbox("⚡ Write Segments in Parallel", value=True, disabled=not full_coverage, help="Draft the episode as several parts at once and stitch them together.")
+    col_stream, col_pre = st.columns([1, 1])
+    stream_script = col_stream.checkbox("🔴 Stream Script", value=True, disabled=parallel_parts and full_coverage, help="Show lines as they are written.")
+    prerender_audio = col_pre.checkbox("🎙️ Pre-render Audio While Writing", value=False, disabled=not stream_script, help="Start synthesizing finished lines while the rest of the script is still being written, so production mostly hits the audio cache.")
+
+    def stream_script_to_editor(llm_client, llm_model, messages, prerender):
+        """Streams the script into a live preview, optionally feeding finished lines to the TTS pool."""
+        live = st.container(border=True)
+        heading = live.empty()
+        script, lines = None, []
+
+        def streamed_lines():
+            nonlocal script
+            for kind, value in iter_script_events(stream_text(llm_client, llm_model, messages, use_cache=reuse_responses)):
+                if kind == "title": heading.subheader(value)
+                elif kind == "done": script = value
+                else:
+                    lines.append(value)
+                    live.markdown(f"**{value.get('speaker', 'Host 1')}:** {value['text']}")
+                    yield value
+
+        if not (prerender and openai_key):
+            for _ in streamed_lines(): pass
+        else:
+            audio_client = get_openai_client(openai_key)
+            voices = VOICE_MAP[voice_style]
+            with ThreadPoolExecutor(max_workers=tts_workers) as pool:
+                prerender = carry_context(prerender_line)
+                futures = [pool.submit(prerender, audio_client, group, voices) for group in iter_merged_lines(streamed_lines())]
+                with st.spinner("Finishing audio pre-render..."):
+                    rendered = sum(f.result() for f in futures)
+            prune_cache()
+            st.info(f"🎙️ {rendered}/{len(futures)} audio segments pre-rendered. Start Production will reuse them.")
+        live.empty()
+        return script
+
     if st.button("Generate Podcast Script", type="primary"):
-        if not st.session_state.source_text: st.error("No source text loaded.")
+        if not source_text: st.error("No source text loaded.")
         else:
             # Get LLM Client (OpenAI or xAI)
             llm_client, llm_model, err = get_llm_client(model_choice, xai_version, openai_key, xai_key)
@@ -352,60 +444,33 @@ with tab3:
                 st.error(err)
             else:
                 try:
-                    length_instr = "12-15 exchanges"
-                    if "Medium" in length_option: length_instr = "30 exchanges. Deep dive."
-                    elif "Long" in length_option: length_instr = "50 exchanges. Very detailed."
-                    elif "Extra Long" in length_option: length_instr = "80 exchanges. Comprehensive."
-
-                    call_in_instr = ""
-                    if caller_prompt:
-                        call_in_instr = f"MANDATORY: Include a 'Caller' speaker who asks: '{caller_prompt}'. Hosts must discuss this."
-
-                    prompt = f"""
-                    Create a podcast script.
-                    Language: {language}
-                    Length: {length_instr}
-                    Host 1: {host1_persona}
-                    Host 2: {host2_persona}
-                    DIRECTOR NOTES: {user_instructions}
-                    {call_in_instr}
-                    Format: JSON {{ "title": "...", "dialogue": [ {{"speaker": "Host 1", "text": "..."}}, {{"speaker": "Caller", "text": "..."}} ] }}
-                    Text: {st.session_state.source_text[:35000]}
-                    """
-                    
-                    with st.spinner(f"Drafting Script using {llm_model}..."):
-                        res = llm_client.chat.completions.create(
-                            model=llm_model,
-                            messages=[{"role": "user", "content": prompt}],
-                            response_format={"type": "json_object"}
-                        )
-                        st.session_state.script_data = json.loads(res.choices[0].message.content)
-                        st.success("Ready!")
-                        if privacy_mode: st.session_state.source_text = ""
+                    complete = None
+                    if stream_script: complete = lambda messages: stream_script_to_editor(llm_client, llm_model, messages, prerender_audio)
+                    with st.spinner("Writing script..."), traced("Generate Script"), private(privacy_mode):
+                        stage = st.empty()
+                        script = write_script(
+                            llm_client, llm_model, source_text,
+                            {**settings, "instructions": user_instructions, "caller_prompt": caller_prompt},
+                            full_coverage, parallel_parts, reuse_responses, complete, stage.caption)
+                        stage.empty()
+                        if save("script_data", script):
+                            st.session_state.script_rev += 1
+                            st.success("Ready!")
+                        if privacy_mode:
+                            st.session_state.private_artifacts.pop("source_text", None)
+                            get_source_index.clear()
                 except Exception as e: st.error(f"Error: {e}")
 
-    if st.session_state.script_data:
-        data = st.session_state.script_data
-        st.subheader(data.get('title', 'Podcast'))
-        with st.form("edit"):
-            new_d = []
-            for i, l in enumerate(data['dialogue']):
-                c1, c2 = st.columns([1, 5])
-                roles = ["Host 1", "Host 2"]
-                if l['speaker'] == "Caller": roles.append("Caller")
-                idx = 0
-                if l['speaker'] == "Host 2": idx = 1
-                elif l['speaker'] == "Caller": idx = 2
-                spk = c1.selectbox("Role", roles, index=idx if idx < len(roles) else 0, key=f"s{i}")
-                txt = c2.text_area("Line", l['text'], height=70, key=f"t{i}")
-                new_d.append({"speaker": spk, "text": txt})
-            if st.form_submit_button("Save"):
-                st.session_state.script_data['dialogue'] = new_d
-                st.success("Saved")
+    if load("script_data"): script_editor()
 
 # --- TAB 4: AUDIO ---
 with tab4:
-    if st.session_state.script_data and st.button("🎙️ Start Production", type="primary"):
+    progressive = st.checkbox("▶️ Progressive Playback", value=not normalize_master,
+                              help="Publish the episode in parts as they finish, so you can start listening within seconds. "
+                                   "Loudness is then set from the first part, so the episode is no longer normalized as a whole; "
+                                   "this is why it is off by default while loudness normalization is on.")
+    script_data = load("script_data")
+    if script_data and st.button("🎙️ Start Production", type="primary"):
         # Audio generation ALWAYS uses OpenAI
         if not openai_key: 
             st.error("OpenAI API Key is REQUIRED for Audio Generation (even if you used Model B for the script).")
@@ -414,68 +479,46 @@ with tab4:
         progress = st.progress(0)
         status = st.empty()
         # Force OpenAI for Audio
-        audio_client = OpenAI(api_key=openai_key)
-        m_voice, f_voice = voice_map[voice_style]
-        
-        with tempfile.TemporaryDirectory() as tmp:
-            tmp_path = Path(tmp)
-            segs = []
-            script = st.session_state.script_data['dialogue']
-            
-            for i, line in enumerate(script):
-                status.text(f"Recording {i+1}/{len(script)}...")
-                voice = m_voice
-                if line['speaker'] == "Host 2": voice = f_voice
-                elif line['speaker'] == "Caller": voice = "fable"
-                
-                f_path = str(tmp_path / f"line_{i}.mp3")
-                if generate_audio_openai(audio_client, line['text'], voice, f_path):
-                    seg = AudioSegment.from_file(f_path)
-                    if line['speaker'] == "Caller":
-                        from pydub.effects import high_pass_filter, low_pass_filter
-                        seg = high_pass_filter(seg, 300)
-                        seg = low_pass_filter(seg, 3000)
-                    segs.append(seg)
-                    segs.append(AudioSegment.silent(duration=350))
-                progress.progress((i+1)/len(script))
-            
-            if segs:
-                status.text("Mixing...")
-                final = sum(segs)
-                
-                bg_seg = None
-                try:
-                    if bg_source == "Presets" and selected_bg_url:
-                        if download_file_with_headers(selected_bg_url, tmp_path/"bg.mp3"): bg_seg = AudioSegment.from_file(tmp_path/"bg.mp3")
-                    elif bg_source == "Upload Custom" and uploaded_bg_file:
-                        with open(tmp_path/"bg.mp3", "wb") as f: f.write(uploaded_bg_file.getvalue())
-                        bg_seg = AudioSegment.from_file(tmp_path/"bg.mp3")
-                    
-                    if bg_seg:
-                        bg_seg = bg_seg - 22
-                        if music_ramp_up: final = AudioSegment.silent(duration=5000) + final
-                        while len(bg_seg) < len(final) + 5000: bg_seg += bg_seg
-                        bg_seg = bg_seg[:len(final)+2000].fade_out(3000)
-                        final = bg_seg.overlay(final)
-                except: pass
-
-                try:
-                    if uploaded_intro:
-                        with open(tmp_path/"in.mp3","wb") as f: f.write(uploaded_intro.getvalue())
-                        final = AudioSegment.from_file(tmp_path/"in.mp3") + final
-                    if uploaded_outro:
-                        with open(tmp_path/"out.mp3","wb") as f: f.write(uploaded_outro.getvalue())
-                        final = final + AudioSegment.from_file(tmp_path/"out.mp3")
-                except: pass
-
-                final.export(tmp_path/"master.mp3", format="mp3", bitrate="192k")
-                with open(tmp_path/"master.mp3", "rb") as f: ab = f.read()
-                
-                status.success("Done!")
-                st.audio(ab, format="audio/mp3")
-                st.download_button("Download MP3", ab, "podcast.mp3", "audio/mp3")
-
-
-
-
-
+        audio_client = get_openai_client(openai_key)
+        out_dir = EPISODE_DIR / st.session_state.session_id / datetime.now().strftime("%Y%m%d_%H%M%S")
+        store.delete(st.session_state.session_id, ["episode_path"])
+
+        def on_progress(done, total, stats):
+            status.text(f"Recording {done}/{total}... (cache: {stats['hits']} hits, {stats['misses']} new)")
+            progress.progress(done/total)
+            if done == total and not progressive: status.text("Mixing...")
+
+        parts = st.container()
+        def on_chapter(k, path, start_s, end_s):
+            parts.caption(f"Part {k+1} · {int(start_s // 60)}:{int(start_s % 60):02d}–{int(end_s // 60)}:{int(end_s % 60):02d}")
+            parts.audio(str(path), format="audio/mp3")
+
+        status.text("Recording...")
+        with traced("Production"):
+            episode, tts_stats = produce_episode(audio_client, script_data['dialogue'],
+                                                 {**settings, "progressive": progressive}, out_dir, on_progress, on_chapter)
+        if episode:
+            save("episode_path", str(episode))
+            status.success(f"Done! (audio cache: {tts_stats['hits']} hits, {tts_stats['misses']} new)")
+        prune_cache(EPISODE_DIR, EPISODE_MAX_BYTES, "*/*/*.mp3")
+
+    # Served from the file on disk, so the episode survives reruns without a bytes copy in session state.
+    episode_path = load("episode_path")
+    if episode_path and os.path.exists(episode_path):
+        st.audio(episode_path, format="audio/mp3")
+        with open(episode_path, "rb") as f:
+            st.download_button("Download MP3", f, "podcast.mp3", "audio/mp3")
+
+# ================= PERFORMANCE =================
+if st.session_state.traces:
+    with st.expander("⏱️ Performance Trace"):
+        traces = st.session_state.traces
+        k = st.selectbox("Run", range(len(traces)), format_func=lambda k: f"{traces[k].name} · {datetime.fromtimestamp(traces[k].started).strftime('%H:%M:%S')}")
+        trace = traces[k]
+        st.caption(f"{len(trace.spans)} spans · {max((sp['end'] for sp in trace.spans), default=0):.2f}s wall time. Times overlap where work runs in parallel.")
+        st.dataframe(trace.summary(), hide_index=True)
+        stamp = datetime.fromtimestamp(trace.started).strftime("%Y%m%d_%H%M%S")
+        col_json, col_chrome = st.columns([1, 1])
+        col_json.download_button("💾 Download JSON", trace.to_json(), f"trace_{stamp}.json", "application/json")
+        col_chrome.download_button("💾 Download Chrome Trace", trace.to_chrome_trace(), f"trace_{stamp}.trace.json", "application/json",
+                                   help="Open in chrome://tracing or ui.perfetto.dev.")
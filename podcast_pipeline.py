@@ -0,0 +1,1406 @@
+"""
+PodcastLM pipeline: everything the Studio does, without Streamlit.
+
+Source extraction, script writing, TTS, mixing and export live here so they can be driven
+by the web app (podcast_cloud.py), the batch runner (podcast_batch.py) or any other script.
+Heavy or rarely used dependencies (yt_dlp, BeautifulSoup, SciPy, document parsers) are
+imported where they are used, so importing this module stays fast.
+"""
+import os
+import tempfile
+import json
+import requests
+from requests.adapters import HTTPAdapter
+import re
+import time
+import random
+import hashlib
+import subprocess
+import io
+import threading
+import contextvars
+from contextlib import contextmanager
+from pathlib import Path
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+from pydub import AudioSegment
+
+from doc_extract import DOCUMENT_TYPES, iter_document_text
+from session_store import DATA_DIR
+
+# ================= INSTRUMENTATION =================
+_trace = contextvars.ContextVar("podcastlm_trace", default=None)
+_span = contextvars.ContextVar("podcastlm_span", default=None)
+
+class Trace:
+    """
+    Timed spans recorded while a trace is active (see tracing()). Each span has a name, a category
+    (extract, llm, tts, download, mix, export...), its parent, thread and free-form args such as
+    bytes, chars, retries and cache hits.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.started = time.time()
+        self.t0 = time.perf_counter()
+        self.spans = []
+        self.lock = threading.Lock()
+
+    def add(self, record):
+        with self.lock: self.spans.append(record)
+
+    def summary(self):
+        """One row per (category, name): count, total and max seconds, summed numeric args and cache hits."""
+        rows = {}
+        for sp in sorted(self.spans, key=lambda sp: sp["start"]):
+            row = rows.setdefault((sp["cat"], sp["name"]), {"category": sp["cat"], "stage": sp["name"], "count": 0, "seconds": 0.0, "max_s": 0.0})
+            dur = sp["end"] - sp["start"]
+            row["count"] += 1
+            row["seconds"] += dur
+            row["max_s"] = max(row["max_s"], dur)
+            for k, v in sp["args"].items():
+                if k == "cache": row[f"cache_{v}"] = row.get(f"cache_{v}", 0) + 1
+                elif isinstance(v, (int, float)) and not isinstance(v, bool): row[k] = row.get(k, 0) + v
+                elif k == "error": row["errors"] = row.get("errors", 0) + 1
+        for row in rows.values():
+            row["seconds"], row["max_s"] = round(row["seconds"], 3), round(row["max_s"], 3)
+        return list(rows.values())
+
+    def to_json(self):
+        return json.dumps({"name": self.name, "started": self.started, "spans": self.spans, "summary": self.summary()}, indent=1, default=str)
+
+    def to_chrome_trace(self):
+        """Chrome trace event format, for chrome://tracing or https://ui.perfetto.dev."""
+        threads = {}
+        events = [{"name": "process_name", "ph": "M", "pid": 1, "args": {"name": self.name}}]
+        for sp in sorted(self.spans, key=lambda sp: sp["start"]):
+            tid = threads.setdefault(sp["thread"], len(threads) + 1)
+            events.append({"name": sp["name"], "cat": sp["cat"], "ph": "X", "pid": 1, "tid": tid,
+                           "ts": round(sp["start"] * 1e6), "dur": round((sp["end"] - sp["start"]) * 1e6), "args": sp["args"]})
+        return json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}, default=str)
+
+@contextmanager
+def tracing(trace):
+    """Records spans from this thread (and from pool work submitted via carry_context) into trace."""
+    token = _trace.set(trace)
+    try: yield trace
+    finally: _trace.reset(token)
+
+@contextmanager
+def span(name, cat="pipeline", **args):
+    """
+    Times the enclosed block as a span of the active trace; a no-op without one.
+    Yields the span's args dict, so the block can add bytes, cache hits, retries and so on.
+    """
+    trace = _trace.get()
+    if trace is None:
+        yield args
+        return
+    parent = _span.get()
+    record = {"name": name, "cat": cat, "start": time.perf_counter() - trace.t0, "thread": threading.current_thread().name,
+              "parent": parent["id"] if parent else None, "id": f"{id(args):x}.{time.perf_counter_ns()}", "args": args}
+    token = _span.set(record)
+    try: yield args
+    except BaseException as e:
+        args["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _span.reset(token)
+        record["end"] = time.perf_counter() - trace.t0
+        trace.add(record)
+
+def note(**counts):
+    """Adds counts (e.g. retries=1) to the innermost open span, if any."""
+    if (current := _span.get()) is not None:
+        for k, v in counts.items(): current["args"][k] = current["args"].get(k, 0) + v
+
+def carry_context(fn):
+    """fn wrapped to run on a pool thread inside the caller's trace and span."""
+    ctx = contextvars.copy_context()
+    return lambda *a, **kw: ctx.copy().run(fn, *a, **kw)
+
+# ================= CLIENTS & SOURCES =================
+
+CLIENT_CACHE_SIZE = 8
+
+@lru_cache(maxsize=CLIENT_CACHE_SIZE)
+def get_openai_client(api_key, base_url=None):
+    """
+    One client (and HTTP connection pool) per provider/key, shared across reruns and sessions.
+    Only the CLIENT_CACHE_SIZE most recently used keys are kept, so typed-in keys do not pile up in memory.
+    The SDK's own retries are off: calls go through with_retries (or their own loop), so every attempt is counted.
+    """
+    from openai import OpenAI
+    return OpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+
+def get_llm_client(model_selection, specific_model_name, openai_key, xai_key):
+    """
+    Returns client and model string.
+    """
+    if model_selection == "Model A (OpenAI)":
+        if not openai_key: return None, None, "Missing OpenAI API Key"
+        return get_openai_client(openai_key), "gpt-4o-mini", None
+    
+    elif model_selection == "Model B (xAI Grok)":
+        if not xai_key: return None, None, "Missing xAI API Key"
+        return get_openai_client(xai_key, "https://api.x.ai/v1"), specific_model_name, None
+        
+    return None, None, "Invalid Selection"
+
+@lru_cache(maxsize=None)
+def get_http_session():
+    """Shared keep-alive connection pool for all plain HTTP fetches."""
+    session = requests.Session()
+    session.headers['User-Agent'] = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)'
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=16)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def fetch_bytes(url, timeout=15):
+    with span("fetch", "download", url=url) as info:
+        try:
+            response = get_http_session().get(url, timeout=timeout)
+            info["bytes"] = len(response.content)
+            return response.content if response.status_code == 200 else None
+        except: return None
+
+def scrape_website(url):
+    """Main text of a page, or of the articles a sitemap/RSS/Atom feed lists; None if nothing could be read."""
+    with span("scrape_website", "download", url=url):
+        return "".join(article_text(u, article) for u, article, err in iter_web_articles([url]) if err is None) or None
+
+AUDIO_TYPES = (".mp3", ".mp4", ".wav", ".m4a", ".mpeg", ".webm")
+
+def read_file(file):
+    """(name, bytes) for a Streamlit upload or a local path."""
+    if isinstance(file, (str, Path)): return Path(file).name, Path(file).read_bytes()
+    return file.name, file.getvalue()
+
+def extract_text_from_files(files, audio_client=None, on_issue=None):
+    """
+    Documents are parsed in parallel worker processes (see doc_extract) and cached by content
+    hash; audio is transcribed after. Pieces are joined once, in input order.
+    files may be Streamlit uploads or paths. Skipped and failed files are reported as
+    on_issue(level, message) with level "warning" or "error".
+    """
+    report = on_issue or (lambda level, message: None)
+    with span("extract_text_from_files", "extract", files=len(files)) as info:
+        files = [read_file(f) for f in files]
+        info["bytes"] = sum(len(data) for _, data in files)
+        parts = [[] for _ in files]
+        docs = []
+        for i, (name, data) in enumerate(files):
+            if name.lower().endswith(DOCUMENT_TYPES):
+                docs.append((i, name.lower(), data))
+            elif not name.lower().endswith(AUDIO_TYPES):
+                report("warning", f"Skipped {name}: Unsupported format.")
+
+        with span("documents", "extract", files=len(docs), bytes=sum(len(d) for _, _, d in docs)):
+            for i, piece, err in iter_document_text(docs, None if _private.get() else EXTRACT_CACHE_DIR):
+                if err is not None: report("error", f"Error reading {files[i][0]}: {err}")
+                else: parts[i].append(piece)
+        if not _private.get(): prune_cache(EXTRACT_CACHE_DIR, EXTRACT_CACHE_MAX_BYTES, "*.txt")
+
+        for i, (name, data) in enumerate(files):
+            if not name.lower().endswith(AUDIO_TYPES): continue
+            if not audio_client:
+                report("warning", f"Skipped {name}: OpenAI Key required for Audio transcription.")
+                continue
+            try:
+                with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(name)[1]) as tmp_file:
+                    tmp_file.write(data)
+                    tmp_path = tmp_file.name
+                try: parts[i].append(transcribe_file(audio_client, tmp_path) + "\n")
+                finally: os.remove(tmp_path)
+            except Exception as e:
+                report("error", f"Error reading {name}: {e}")
+        text = "".join(piece for file_parts in parts for piece in file_parts)
+        info["chars"] = len(text)
+        return text
+
+def download_and_transcribe_video(url, audio_client):
+    with span("download_and_transcribe_video", "download", url=url):
+        return _download_and_transcribe_video(url, audio_client)
+
+def _download_and_transcribe_video(url, audio_client):
+    import yt_dlp
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # No FFmpegExtractAudio pass: transcribe_file decodes the native stream to 16 kHz mono itself.
+            ydl_opts = {
+                'format': 'bestaudio/best',
+                'outtmpl': os.path.join(tmp_dir, 'audio.%(ext)s'),
+                'quiet': True, 'no_warnings': True, 'nocheckcertificate': True,
+                'http_headers': {'User-Agent': 'Mozilla/5.0'}
+            }
+            with yt_dlp.YoutubeDL(ydl_opts) as ydl: ydl.download([url])
+            downloads = sorted(Path(tmp_dir).glob("audio.*"))
+            if not downloads: return None, "Download failed."
+            return transcribe_file(audio_client, downloads[0]), None
+    except Exception as e: return None, str(e)
+
+# ================= AUDIO RENDERING =================
+TTS_MODEL = "tts-1"
+TTS_MAX_CHARS = 4096  # OpenAI speech endpoint input limit
+
+def is_retryable_error(err):
+    """429s, 5xx and dropped connections are worth another attempt; anything else is not."""
+    from openai import APIConnectionError, APITimeoutError
+    if isinstance(err, (APIConnectionError, APITimeoutError)): return True
+    status = getattr(err, "status_code", None)
+    return status == 429 or (status is not None and status >= 500)
+
+def retry_delay(err, attempt, backoff=1.0):
+    """Honours Retry-After when the server sends one, else exponential backoff with jitter."""
+    try:
+        return min(float(err.response.headers.get("retry-after")), 60.0)
+    except: return backoff * (2 ** attempt) + random.uniform(0, backoff)
+
+def with_retries(call, retries=4):
+    """call() retried with retry_delay on retryable errors; retries are counted on the innermost span."""
+    for attempt in range(retries + 1):
+        try: return call()
+        except Exception as e:
+            if attempt == retries or not is_retryable_error(e): raise
+            note(retries=1)
+            time.sleep(retry_delay(e, attempt))
+
+def generate_audio_openai(client, text, voice, filename, speed=1.0, retries=4):
+    with span("generate_audio_openai", "tts", voice=voice, chars=len(text)) as info:
+        def call():
+            started = time.perf_counter()
+            client.audio.speech.create(model=TTS_MODEL, voice=voice, input=text, speed=speed).stream_to_file(filename)
+            info["api_s"] = round(time.perf_counter() - started, 3)
+        try: with_retries(call, retries)
+        except Exception as e:
+            info["error"] = f"{type(e).__name__}: {e}"
+            return False
+        info["bytes"] = os.path.getsize(filename)
+        return True
+
+# ================= SEGMENT CACHE =================
+CACHE_DIR = Path(os.environ.get("PODCASTLM_CACHE_DIR") or Path(tempfile.gettempdir()) / "podcastlm_cache")
+TTS_CACHE_DIR = CACHE_DIR / "tts"
+TTS_CACHE_MAX_BYTES = 512 * 1024 * 1024
+EXTRACT_CACHE_DIR = CACHE_DIR / "extract"
+EXTRACT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+STALE_PART_SECONDS = 3600  # temp files this old were left by a crashed writer
+
+_private = contextvars.ContextVar("podcastlm_private", default=False)
+
+@contextmanager
+def private(enabled=True):
+    """
+    While enabled, source-derived data (extracted document text, fetched pages, LLM responses) is
+    neither read from nor written to the disk caches. Pool work started via carry_context inherits it.
+    """
+    token = _private.set(enabled)
+    try: yield
+    finally: _private.reset(token)
+
+@contextmanager
+def write_atomic(path):
+    """
+    Yields a temp path next to path for the block to write. When the block ends, the temp file
+    replaces path, so readers never see a half-written file; if the block raises, it is deleted.
+    A block that leaves no file at the temp path leaves path untouched.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{random.getrandbits(32):08x}.part")
+    try:
+        yield tmp
+        if tmp.exists(): os.replace(tmp, path)
+    except:
+        try: tmp.unlink()
+        except OSError: pass
+        raise
+
+def tts_cache_key(text, voice, model=TTS_MODEL, speed=1.0, caller=False):
+    payload = json.dumps([text, voice, model, speed, caller], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def cached_audio_path(text, voice, speed=1.0, caller=False, cache_dir=TTS_CACHE_DIR):
+    return Path(cache_dir) / f"{tts_cache_key(text, voice, TTS_MODEL, speed, caller)}.mp3"
+
+def generate_audio_cached(client, text, voice, path, speed=1.0):
+    """Renders through write_atomic, so concurrent runs never see a half-written entry."""
+    with write_atomic(path) as tmp:
+        if not generate_audio_openai(client, text, voice, str(tmp), speed):
+            tmp.unlink(missing_ok=True)
+            return False
+    return True
+
+def prune_cache(cache_dir=TTS_CACHE_DIR, max_bytes=TTS_CACHE_MAX_BYTES, pattern="*.mp3"):
+    """
+    Evicts least-recently-used entries (hits refresh mtime) until the cache fits in max_bytes, and
+    deletes write_atomic temp files next to them that a crashed writer left behind.
+    """
+    entries = []
+    for f in Path(cache_dir).glob(str(Path(pattern).parent / "*.part")):
+        try:
+            if f.stat().st_mtime < time.time() - STALE_PART_SECONDS: f.unlink()
+        except OSError: pass
+    for f in Path(cache_dir).glob(pattern):
+        try:
+            info = f.stat()
+            entries.append((info.st_mtime, info.st_size, f))
+        except OSError: pass
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    for _, size, f in entries:
+        if total <= max_bytes: break
+        try:
+            f.unlink()
+            total -= size
+        except OSError: pass
+
+def voice_for_speaker(speaker, m_voice, f_voice):
+    if speaker == "Host 2": return f_voice
+    if speaker == "Caller": return "fable"
+    return m_voice
+
+def iter_merged_lines(dialogue, max_chars=TTS_MAX_CHARS):
+    """
+    Joins adjacent lines by the same speaker so they go out as one TTS request.
+    Empty lines are dropped; a merge never exceeds the TTS input limit.
+    Works on any iterable and yields each group as soon as it is closed, so it can run on a live stream.
+    """
+    prev = None
+    for line in dialogue:
+        text = line['text'].strip()
+        if not text: continue
+        if prev and prev['speaker'] == line['speaker'] and len(prev['text']) + len(text) + 1 <= max_chars:
+            prev['text'] += " " + text
+        else:
+            if prev: yield prev
+            prev = {"speaker": line['speaker'], "text": text}
+    if prev: yield prev
+
+def merge_dialogue_lines(dialogue, max_chars=TTS_MAX_CHARS):
+    return list(iter_merged_lines(dialogue, max_chars))
+
+def line_audio_path(line, voices, cache_dir=TTS_CACHE_DIR):
+    voice = voice_for_speaker(line['speaker'], *voices)
+    return voice, cached_audio_path(line['text'], voice, caller=line['speaker'] == "Caller", cache_dir=cache_dir)
+
+def prerender_line(client, line, voices, cache_dir=TTS_CACHE_DIR):
+    """Puts one line in the segment cache ahead of production; returns True if it is there."""
+    voice, path = line_audio_path(line, voices, cache_dir)
+    return path.exists() or generate_audio_cached(client, line['text'], voice, path)
+
+def iter_dialogue_audio(client, lines, voices, max_workers=4, prepare=None, cache_dir=TTS_CACHE_DIR):
+    """
+    Renders every line through the segment cache on a bounded thread pool; only misses call the API.
+    Yields (i, result, stats) as each line finishes, in completion order. result is the cached file
+    path, or prepare(i, line, path) evaluated on the worker when given, or None if synthesis failed.
+    stats is a running {"hits": n, "misses": n}. Lines are submitted in script order, so early lines finish first.
+    """
+    stats = {"hits": 0, "misses": 0}
+    def run(i, line, voice, path, hit):
+        with span(f"line {i}", "tts", speaker=line['speaker'], chars=len(line['text']), cache="hit" if hit else "miss"):
+            if not hit and not generate_audio_cached(client, line['text'], voice, path): return None
+            if not prepare: return str(path)
+            with span("decode", "mix"): return prepare(i, line, str(path))
+
+    run = carry_context(run)
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        futures = {}
+        for i, line in enumerate(lines):
+            voice, path = line_audio_path(line, voices, cache_dir)
+            hit = path.exists()
+            if hit: os.utime(path)
+            futures[pool.submit(run, i, line, voice, path, hit)] = (i, hit)
+        for fut in as_completed(futures):
+            i, hit = futures[fut]
+            stats["hits" if hit else "misses"] += 1
+            yield i, fut.result(), stats
+    prune_cache(cache_dir)
+
+# ================= MIXING ENGINE =================
+# Everything is mixed as float32 PCM on one timeline at a fixed rate.
+# Voices stay mono (shape (n, 1)) and broadcast into the stereo master.
+MIX_RATE = 24000
+MIX_CHANNELS = 2
+
+def ms_to_frames(ms): return int(round(ms * MIX_RATE / 1000))
+
+def db_to_gain(db): return 10 ** (db / 20)
+
+def segment_to_pcm(seg, channels=MIX_CHANNELS):
+    seg = seg.set_frame_rate(MIX_RATE).set_channels(channels).set_sample_width(2)
+    return np.frombuffer(seg.raw_data, dtype=np.int16).reshape(-1, channels).astype(np.float32) / 32768.0
+
+def load_pcm(path, channels=MIX_CHANNELS):
+    return segment_to_pcm(AudioSegment.from_file(path), channels)
+
+ASSET_CACHE_DIR = CACHE_DIR / "assets"
+ASSET_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+
+def asset_pcm(key, load, channels=MIX_CHANNELS):
+    """
+    Decoded PCM for a music/intro/outro asset, memory-mapped from the asset cache.
+    key identifies the source ("url:..." or "sha256:..."); load() returns the encoded bytes
+    (or None) and is only called on a miss, so repeat productions skip network and decode.
+    """
+    digest = hashlib.sha256(f"{key}|{MIX_RATE}|{channels}".encode("utf-8")).hexdigest()
+    path = ASSET_CACHE_DIR / f"{digest}.npy"
+    with span("asset", "mix", key=key[:80], cache="hit" if path.exists() else "miss") as info:
+        if path.exists(): os.utime(path)
+        else:
+            data = load()
+            if not data: return None
+            info["bytes"] = len(data)
+            pcm = segment_to_pcm(AudioSegment.from_file(io.BytesIO(data)), channels)
+            with write_atomic(path) as tmp, open(tmp, "wb") as f: np.save(f, pcm)
+            prune_cache(ASSET_CACHE_DIR, ASSET_CACHE_MAX_BYTES, "*.npy")
+        return np.load(path, mmap_mode="r")
+
+def url_asset_pcm(url): return asset_pcm(f"url:{url}", lambda: fetch_bytes(url))
+
+def file_asset_pcm(file):
+    """Asset PCM for a Streamlit upload or a local path, keyed by content."""
+    data = read_file(file)[1]
+    return asset_pcm(f"sha256:{hashlib.sha256(data).hexdigest()}", lambda: data)
+
+def build_timeline(voices, bed=None, intro=None, outro=None, gap_ms=350, lead_in_ms=0,
+                   bed_gain_db=-22, bed_tail_ms=2000, bed_fade_ms=3000, duck_db=None, final=True):
+    """
+    Lays out an episode: intro, then each voice clip followed by a gap, then outro.
+    With a music bed, the dialogue starts lead_in_ms into the bed and the bed runs
+    bed_tail_ms past the last gap, fading out over its final bed_fade_ms.
+    duck_db, if set, lowers the bed by that much while anyone is speaking.
+    final=False lays out only the dialogue so far: the bed stays open-ended and there is no outro.
+    Frames before "settled" then render exactly as they will in the finished episode, whatever lines
+    follow; it stops short of the last voice where the bed's closing fade could still reach back.
+    Returns a plain dict consumed by render_timeline; "speech" lists voice spans in frames.
+    """
+    pos = len(intro) if intro is not None else 0
+    clips = [(0, intro, 1.0)] if intro is not None else []
+    body_start = pos
+    if bed is not None: pos += ms_to_frames(lead_in_ms)
+    speech = []
+    gap = ms_to_frames(gap_ms)
+    for pcm in voices:
+        clips.append((pos, pcm, 1.0))
+        speech.append((pos, pos + len(pcm)))
+        pos += len(pcm) + gap
+    bed_spec = None
+    settled = speech[-1][1] if speech else pos
+    if bed is not None and len(bed):
+        settled = min(settled, pos + ms_to_frames(bed_tail_ms) - ms_to_frames(bed_fade_ms))
+        if final: pos += ms_to_frames(bed_tail_ms)
+        bed_spec = {"pcm": bed, "start": body_start, "stop": pos if final else None, "gain": db_to_gain(bed_gain_db),
+                    "fade": ms_to_frames(bed_fade_ms), "duck_db": duck_db, "speech": speech}
+    if outro is not None and final:
+        clips.append((pos, outro, 1.0))
+        pos += len(outro)
+    return {"length": pos, "clips": clips, "bed": bed_spec, "speech": speech, "settled": pos if final else settled}
+
+def _render_bed(out, start, bed):
+    """Tiles the loop into out by slice copies (no per-sample indexing), then applies gain and the fade-out."""
+    stop = start + len(out)
+    a, b = max(start, bed["start"]), stop if bed["stop"] is None else min(stop, bed["stop"])
+    if a >= b: return
+    src = bed["pcm"]
+    pos = a
+    while pos < b:
+        phase = (pos - bed["start"]) % len(src)
+        take = min(len(src) - phase, b - pos)
+        out[pos - start:pos - start + take] = src[phase:phase + take]
+        pos += take
+    out[a - start:b - start] *= bed["gain"]
+    if bed.get("duck_db"):
+        out[a - start:b - start] *= duck_envelope(bed["speech"], a, b, bed["duck_db"])[:, None]
+    if bed["stop"] is None or bed["fade"] <= 0: return
+    fa = max(a, bed["stop"] - bed["fade"])
+    if fa < b:
+        ramp = (bed["stop"] - np.arange(fa, b, dtype=np.float64)) / bed["fade"]
+        out[fa - start:b - start] *= ramp.astype(np.float32)[:, None]
+
+def render_timeline(timeline, start=0, stop=None):
+    """Renders frames [start, stop) of a timeline into a single preallocated buffer."""
+    stop = timeline["length"] if stop is None else min(stop, timeline["length"])
+    out = np.zeros((max(0, stop - start), MIX_CHANNELS), dtype=np.float32)
+    if timeline["bed"]: _render_bed(out, start, timeline["bed"])
+    for offset, pcm, gain in timeline["clips"]:
+        a, b = max(start, offset), min(stop, offset + len(pcm))
+        if a >= b: continue
+        clip = pcm[a - offset:b - offset]
+        out[a - start:b - start] += clip if gain == 1.0 else clip * gain
+    return out
+
+# ================= EFFECTS =================
+# Vectorized replacements for pydub's per-sample filters. All take and return float32 PCM
+# of shape (frames, channels) at MIX_RATE.
+
+def phone_filter(pcm, low_hz=300, high_hz=3000, order=4):
+    """Telephone band-pass for Caller lines."""
+    from scipy.signal import butter, sosfilt
+    sos = butter(order, [low_hz, high_hz], btype="bandpass", fs=MIX_RATE, output="sos")
+    return sosfilt(sos, pcm, axis=0).astype(np.float32)
+
+def duck_envelope(speech, start, stop, duck_db, attack_ms=150, release_ms=500, hop_ms=10):
+    """
+    Bed gain over frames [start, stop): duck_db under speech, 0 dB in the gaps, with linear-in-dB
+    ramps starting attack_ms before each span and recovering over release_ms after it.
+    Computed on a hop_ms grid from the sorted span list, so any block can be rendered on its own.
+    """
+    if not speech: return np.ones(stop - start, dtype=np.float32)
+    starts = np.array([a for a, _ in speech], dtype=np.float64)
+    ends = np.array([b for _, b in speech], dtype=np.float64)
+    hop = ms_to_frames(hop_ms)
+    t = np.arange(start, stop + hop, hop, dtype=np.float64)
+    prev = np.searchsorted(starts, t, side="right") - 1
+    inside = (prev >= 0) & (t < ends[np.maximum(prev, 0)])
+    since_end = np.where(prev >= 0, t - ends[np.maximum(prev, 0)], np.inf)
+    nxt = np.minimum(prev + 1, len(starts) - 1)
+    to_start = np.where(prev + 1 < len(starts), starts[nxt] - t, np.inf)
+    amount = np.maximum(np.clip(1 - to_start / ms_to_frames(attack_ms), 0, 1),
+                        np.clip(1 - since_end / ms_to_frames(release_ms), 0, 1))
+    amount[inside] = 1.0
+    gain = db_to_gain(duck_db * amount)
+    return np.interp(np.arange(start, stop, dtype=np.float64), t, gain).astype(np.float32)
+
+def k_weighting_sos(rate=MIX_RATE):
+    """BS.1770 K-weighting (high shelf + RLB high-pass) for an arbitrary sample rate."""
+    k = np.tan(np.pi * 1681.974450955533 / rate)
+    q = 0.7071752369554196
+    vh = 10 ** (3.999843853973347 / 20)
+    vb = vh ** 0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf = [(vh + vb * k / q + k * k) / a0, 2 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0,
+             1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+    k = np.tan(np.pi * 38.13547087602444 / rate)
+    q = 0.5003270373238773
+    a0 = 1 + k / q + k * k
+    highpass = [1.0, -2.0, 1.0, 1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+    return np.array([shelf, highpass])
+
+def measure_loudness(blocks):
+    """
+    Integrated loudness in LUFS (EBU R128 gating: 400 ms blocks, 75% overlap, -70 LUFS absolute
+    and -10 LU relative gates) of an iterable of PCM blocks. Filter state is carried between
+    blocks, so a long master can be measured without holding it in memory.
+    """
+    from scipy.signal import sosfilt
+    sos = k_weighting_sos()
+    hop = ms_to_frames(100)
+    zi, carry, powers = None, None, []
+    for blk in blocks:
+        if zi is None:
+            zi = np.zeros((sos.shape[0], 2, blk.shape[1]))
+            carry = np.zeros((0, blk.shape[1]), dtype=np.float32)
+        y, zi = sosfilt(sos, blk, axis=0, zi=zi)
+        y = np.concatenate([carry, y.astype(np.float32)])
+        n = len(y) // hop * hop
+        powers.append(np.square(y[:n], dtype=np.float64).reshape(-1, hop, y.shape[1]).mean(axis=1))
+        carry = y[n:]
+    if not powers: return float("-inf")
+    p = np.concatenate(powers)
+    if len(p) < 4: return float("-inf")
+    z = ((p[:-3] + p[1:-2] + p[2:-1] + p[3:]) / 4).sum(axis=1)
+    with np.errstate(divide="ignore"):
+        lk = -0.691 + 10 * np.log10(z)
+    z = z[lk > -70]
+    if not len(z): return float("-inf")
+    rel_gate = -0.691 + 10 * np.log10(z.mean()) - 10
+    z = z[-0.691 + 10 * np.log10(z) > rel_gate]
+    return float(-0.691 + 10 * np.log10(z.mean()))
+
+def loudness_gain(loudness, peak, target_lufs=-16.0, ceiling_db=-1.0):
+    """Linear gain that brings loudness to target_lufs without pushing the sample peak past ceiling_db."""
+    if not np.isfinite(loudness) or peak <= 0: return 1.0
+    return float(min(db_to_gain(target_lufs - loudness), db_to_gain(ceiling_db) / peak))
+
+# ================= RENDERING =================
+# The master is never held in memory: the timeline is rendered in fixed-size blocks and piped
+# straight into an ffmpeg MP3 encoder. Loudness is measured in a first, output-free pass.
+RENDER_BLOCK_SECONDS = 10
+MASTER_RATE = 44100
+MP3_QUALITY = 7  # LAME -q: about 2.5x faster to encode than the default, inaudible on speech at 192 kbps
+
+FIRST_CHAPTER_LINES = 2  # the first part is kept short so playback can start within seconds
+CHAPTER_LINES = 8
+EPISODE_DIR = DATA_DIR / "episodes"  # not under CACHE_DIR: resumed sessions point here after a reboot
+EPISODE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+def iter_rendered(timeline, start=0, stop=None, block_seconds=RENDER_BLOCK_SECONDS):
+    stop = timeline["length"] if stop is None else stop
+    size = MIX_RATE * block_seconds
+    for a in range(start, stop, size): yield render_timeline(timeline, a, min(a + size, stop))
+
+def measure_gain(timeline, start=0, stop=None):
+    """Loudness-normalizing gain for a frame range, from an output-free render pass."""
+    with span("measure_loudness", "mix", frames=(stop or timeline["length"]) - start):
+        return _measure_gain(timeline, start, stop)
+
+def _measure_gain(timeline, start, stop):
+    peak = 0.0
+    def measured():
+        nonlocal peak
+        for block in iter_rendered(timeline, start, stop):
+            if len(block): peak = max(peak, float(np.abs(block).max()))
+            yield block
+    return loudness_gain(measure_loudness(measured()), peak)
+
+def open_mp3_encoder(out_path, bitrate="192k"):
+    """
+    ffmpeg encoding s16le written to its stdin. Callers encode into a write_atomic temp path, so the
+    final path never holds a truncated MP3.
+    """
+    cmd = [AudioSegment.converter, "-nostdin", "-loglevel", "error", "-y",
+           "-f", "s16le", "-ar", str(MIX_RATE), "-ac", str(MIX_CHANNELS), "-i", "-",
+           "-ar", str(MASTER_RATE), "-b:a", bitrate, "-compression_level", str(MP3_QUALITY), "-f", "mp3", str(out_path)]
+    return subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+def close_mp3_encoder(proc):
+    try:
+        proc.stdin.close()
+        if proc.wait() != 0: raise RuntimeError(f"MP3 export failed: {proc.stderr.read().decode(errors='replace')}")
+    except:
+        abort_mp3_encoder(proc)
+        raise
+    proc.stderr.close()
+
+def abort_mp3_encoder(proc):
+    """Kills and reaps the encoder; write_atomic deletes its partial output."""
+    proc.kill()
+    proc.wait()
+    for pipe in (proc.stdin, proc.stderr):
+        try: pipe.close()
+        except OSError: pass
+
+def pcm_bytes(block, gain=1.0):
+    if gain != 1.0: block *= gain
+    return (np.clip(block, -1.0, 1.0) * 32767).astype(np.int16).tobytes()
+
+def limit_peaks(block, gain, ceiling_db=-1.0):
+    """
+    block scaled by gain, with gain lowered just enough that no sample passes ceiling_db. The drop is
+    ramped in from the start of the block to the first sample that would pass, and never undone.
+    Returns (block, gain for the next block).
+    """
+    ceiling = db_to_gain(ceiling_db)
+    level = np.abs(block).max(axis=1) if len(block) else np.zeros(0, dtype=np.float32)
+    over = np.flatnonzero(level * gain > ceiling)
+    if not len(over):
+        block *= gain
+        return block, gain
+    target = ceiling / float(level.max())
+    ramp = np.full(len(block), target, dtype=np.float32)
+    ramp[:over[0]] = np.linspace(gain, target, over[0], endpoint=False)
+    block *= ramp[:, None]
+    return block, target
+
+def export_mp3(timeline, out_path, normalize=True):
+    """Encodes a timeline to MP3 with memory bounded by one block, whatever the episode length."""
+    gain = measure_gain(timeline) if normalize else 1.0
+    with span("export_mp3", "export", frames=timeline["length"]) as info:
+        with write_atomic(out_path) as tmp:
+            proc = open_mp3_encoder(tmp)
+            try:
+                for block in iter_rendered(timeline): proc.stdin.write(pcm_bytes(block, gain))
+            except:
+                abort_mp3_encoder(proc)
+                raise
+            close_mp3_encoder(proc)
+        info["bytes"] = os.path.getsize(out_path)
+
+def export_progressive(ready_voices, layout, out_dir, normalize=True, on_chapter=None, total=None):
+    """
+    Publishes an episode in parts while its lines are still being synthesized.
+    ready_voices yields (i, voice_pcm or None) for each of the total lines in any order; layout holds
+    the other build_timeline arguments. Each time enough consecutive lines are ready, the settled frames
+    (see build_timeline) up to the end of a line are encoded to out_dir/part_NNN.mp3 and
+    on_chapter(k, path, start_s, end_s) is called. The last line is never cut on; it closes the final part.
+    The same frames feed one continuous encoder for the gapless full episode, which is returned
+    (None if no line rendered). With normalize, the loudness gain is measured on the first part;
+    later parts are only ever turned down, by limit_peaks, to keep their peaks under the ceiling.
+    """
+    out_dir = Path(out_dir)
+    master_path = out_dir / "podcast.mp3"
+    pending, voices = {}, []
+    next_i = since_cut = cut = k = 0
+    gain = None
+
+    def emit(timeline, stop, writers, lines):
+        nonlocal since_cut, cut, k, gain
+        if gain is None: gain = measure_gain(timeline, cut, stop) if normalize else 1.0
+        path = out_dir / f"part_{k + 1:03d}.mp3"
+        with span(f"part {k + 1}", "export", frames=stop - cut, lines=lines), write_atomic(path) as tmp:
+            part = open_mp3_encoder(tmp)
+            try:
+                for block in iter_rendered(timeline, cut, stop):
+                    if normalize: block, gain = limit_peaks(block, gain)
+                    data = pcm_bytes(block)
+                    list(writers.map(lambda proc: proc.stdin.write(data), (master, part)))
+            except:
+                abort_mp3_encoder(part)
+                raise
+            close_mp3_encoder(part)
+        if on_chapter: on_chapter(k, path, cut / MIX_RATE, stop / MIX_RATE)
+        since_cut, cut, k = since_cut - lines, stop, k + 1
+
+    with write_atomic(master_path) as master_tmp:
+        master = open_mp3_encoder(master_tmp)
+        try:
+            with ThreadPoolExecutor(max_workers=2) as writers:
+                for i, pcm in ready_voices:
+                    pending[i] = pcm
+                    while next_i in pending:
+                        pcm = pending.pop(next_i)
+                        next_i += 1
+                        if pcm is None: continue
+                        voices.append(pcm)
+                        since_cut += 1
+                        if since_cut >= (FIRST_CHAPTER_LINES if k == 0 else CHAPTER_LINES) and (total is None or next_i < total):
+                            timeline = build_timeline(voices, final=False, **layout)
+                            ends = [b for _, b in timeline["speech"] if cut < b <= timeline["settled"]]
+                            if ends: emit(timeline, ends[-1], writers, len(ends))
+                if not voices:
+                    abort_mp3_encoder(master)
+                    master_tmp.unlink(missing_ok=True)
+                    return None
+                timeline = build_timeline(voices, **layout)
+                emit(timeline, timeline["length"], writers, since_cut)
+        except:
+            abort_mp3_encoder(master)
+            raise
+        close_mp3_encoder(master)
+    return master_path
+
+# ================= WEB INGESTION =================
+WEB_CACHE_DIR = CACHE_DIR / "web"
+WEB_CACHE_MAX_BYTES = 256 * 1024 * 1024
+WEB_WORKERS = 8
+MAX_FEED_ITEMS = 50
+BOILERPLATE_TAGS = ["script", "style", "noscript", "template", "header", "footer", "nav", "aside", "iframe", "svg", "button"]
+FORM_MAX_CHARS = 500  # forms with less text (search boxes, sign-ups, comment forms) are boilerplate; page-wide ones are not
+TEXT_BLOCK_TAGS = ["h1", "h2", "h3", "h4", "p", "li", "pre", "blockquote"]
+
+def fetch_cached(url, timeout=15):
+    """
+    GET through the shared session, revalidated against the local response cache: a cached response
+    with an ETag or Last-Modified goes out as a conditional request, and a 304 reuses its body.
+    Returns (bytes, content_type); raises on HTTP errors. Entries are one file: a JSON header line, then the body.
+    Inside private() the cache is not used at all.
+    """
+    path = WEB_CACHE_DIR / f"{hashlib.sha256(url.encode('utf-8')).hexdigest()}.http"
+    meta = body = None
+    headers = {}
+    try:
+        if _private.get(): raise OSError("private")
+        with open(path, "rb") as f: meta, body = json.loads(f.readline()), f.read()
+        if meta.get("etag"): headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"): headers["If-Modified-Since"] = meta["last_modified"]
+    except (OSError, ValueError): meta = None
+
+    with span("fetch_cached", "download", url=url) as info:
+        response = get_http_session().get(url, timeout=timeout, headers=headers)
+        if response.status_code == 304 and meta is not None:
+            info.update(cache="hit", bytes=len(body))
+            os.utime(path)
+            return body, meta.get("content_type", "")
+        response.raise_for_status()
+        info.update(cache="miss", bytes=len(response.content))
+        content_type = response.headers.get("Content-Type", "")
+        meta = {"url": url, "etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified"), "content_type": content_type}
+        if (meta["etag"] or meta["last_modified"]) and not _private.get():
+            with write_atomic(path) as tmp, open(tmp, "wb") as f:
+                f.write(json.dumps(meta).encode("utf-8") + b"\n")
+                f.write(response.content)
+        return response.content, content_type
+
+def html_soup(data):
+    """lxml is several times faster than html.parser; the latter is the fallback when lxml is missing."""
+    from bs4 import BeautifulSoup, FeatureNotFound
+    try: return BeautifulSoup(data, "lxml")
+    except FeatureNotFound: return BeautifulSoup(data, "html.parser")
+
+def feed_links(data):
+    """
+    Article URLs listed by a sitemap, RSS or Atom document, ("sitemapindex", child sitemap URLs)
+    for a sitemap index, or None if data is not one of those.
+    """
+    import xml.etree.ElementTree as ET
+    head = data[:2048].lstrip().lower()
+    if not (head.startswith(b"<?xml") or head.startswith((b"<rss", b"<urlset", b"<sitemapindex", b"<feed"))): return None
+    try: root = ET.fromstring(data)
+    except ET.ParseError: return None
+    name = lambda el: el.tag.rsplit("}", 1)[-1]
+    kind = name(root)
+    if kind in ("urlset", "sitemapindex"):
+        links = [el.text.strip() for el in root.iter() if name(el) == "loc" and el.text]
+        return ("sitemapindex", links) if kind == "sitemapindex" else links
+    if kind == "rss":
+        return [el.text.strip() for item in root.iter() if name(item) == "item" for el in item if name(el) == "link" and el.text]
+    if kind == "feed":
+        return [link.get("href") for entry in root if name(entry) == "entry" for link in entry
+                if name(link) == "link" and link.get("href") and link.get("rel", "alternate") == "alternate"]
+    return None
+
+def main_content(soup):
+    """
+    Readability-style extraction. Boilerplate elements and small forms are dropped, every container is scored by the
+    paragraph text it holds (length and commas, discounted by link text), and the headings, paragraphs
+    and list items of the best one are returned as {"title", "text"} with whitespace normalized.
+    """
+    title = soup.find("meta", property="og:title")
+    title = (title.get("content") if title else None) or (soup.title.string if soup.title and soup.title.string else "") or ""
+    for tag in soup(BOILERPLATE_TAGS): tag.decompose()
+    for form in soup("form"):
+        if not form.decomposed and len(form.get_text(" ", strip=True)) < FORM_MAX_CHARS: form.decompose()
+
+    scores = {}
+    for p in soup.find_all(["p", "pre", "blockquote"]):
+        text = p.get_text(" ", strip=True)
+        if len(text) < 25: continue
+        score = 1 + text.count(",") + min(len(text) // 100, 3)
+        for parent, weight in ((p.parent, 1.0), (p.parent.parent if p.parent else None, 0.5)):
+            if parent is None: continue
+            entry = scores.setdefault(id(parent), [parent, 0.0])
+            entry[1] += score * weight
+    def link_density(el):
+        text = len(el.get_text(" ", strip=True)) or 1
+        return sum(len(a.get_text(" ", strip=True)) for a in el.find_all("a")) / text
+    best = max((entry for entry in scores.values()), key=lambda e: e[1] * (1 - link_density(e[0])), default=None)
+    root = best[0] if best else (soup.body or soup)
+
+    blocks = []
+    for el in root.find_all(TEXT_BLOCK_TAGS):
+        if el.find(TEXT_BLOCK_TAGS): continue  # nested blocks are taken on their own
+        text = " ".join(el.get_text(" ", strip=True).split())
+        if text: blocks.append(text)
+    if not blocks: blocks = [" ".join(root.get_text(" ", strip=True).split())]
+    return {"title": " ".join(title.split()), "text": "\n\n".join(blocks)}
+
+def fetch_page(url, timeout=15):
+    """("article", {"title", "text"}) for a web page, ("feed", [article URLs]) for a sitemap, RSS or Atom feed."""
+    data, content_type = fetch_cached(url, timeout)
+    links = feed_links(data) if "html" not in content_type else None
+    if isinstance(links, tuple):  # sitemap index: read child sitemaps until there are enough articles
+        sitemaps, links = links[1], []
+        for sitemap in sitemaps:
+            if isinstance(child := feed_links(fetch_cached(sitemap, timeout)[0]), list): links += child
+            if len(links) >= MAX_FEED_ITEMS: break
+    if links is not None: return "feed", links
+    with span("main_content", "extract", bytes=len(data)) as info:
+        article = main_content(html_soup(data))
+        info["chars"] = len(article["text"])
+    if not article["text"]: raise ValueError("No readable text.")
+    return "article", article
+
+def iter_web_articles(urls, max_workers=WEB_WORKERS, max_feed_items=MAX_FEED_ITEMS):
+    """
+    Fetches pages concurrently through the shared session and yields (url, article, error) in input
+    order as each becomes ready; a feed is replaced by the (first max_feed_items) articles it lists.
+    Input order keeps the source text stable, so repeat runs hit the script cache.
+    """
+    fetch = carry_context(fetch_page)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pages = [(url, pool.submit(fetch, url)) for url in urls]
+        for url, fut in pages:
+            try: kind, value = fut.result()
+            except Exception as e:
+                yield url, None, e
+                continue
+            if kind == "article":
+                yield url, value, None
+                continue
+            items = [(link, pool.submit(fetch, link)) for link in list(dict.fromkeys(value))[:max_feed_items]]
+            for link, item in items:
+                try: kind, article = item.result()
+                except Exception as e:
+                    yield link, None, e
+                    continue
+                if kind == "article": yield link, article, None
+    prune_cache(WEB_CACHE_DIR, WEB_CACHE_MAX_BYTES, "*.http")
+
+def article_text(url, article):
+    return f"# {article['title'] or url}\nSource: {url}\n\n{article['text']}\n\n"
+
+# ================= TRANSCRIPTION =================
+# Whisper rejects uploads over 25 MB, so long recordings are cut at quiet points into
+# chunks that are transcribed concurrently and stitched back in order.
+WHISPER_RATE = 16000
+WHISPER_BITRATE = "32k"  # ~2.4 MB per 10 minutes, far below the upload limit
+WHISPER_CHUNK_SECONDS = 600
+
+def decode_for_whisper(path):
+    """Decodes any audio/video file straight to mono 16 kHz int16 PCM with ffmpeg."""
+    cmd = [AudioSegment.converter, "-nostdin", "-loglevel", "error", "-i", str(path),
+           "-vn", "-ac", "1", "-ar", str(WHISPER_RATE), "-f", "s16le", "-"]
+    return np.frombuffer(subprocess.run(cmd, capture_output=True, check=True).stdout, dtype=np.int16)
+
+def find_split_points(pcm, chunk_seconds=WHISPER_CHUNK_SECONDS, search_seconds=30, frame_ms=50):
+    """
+    Frame boundaries for chunks of at most chunk_seconds. Each cut lands in the quietest
+    frame_ms frame of the last search_seconds before the limit, so words are not split.
+    """
+    limit = chunk_seconds * WHISPER_RATE
+    frame = WHISPER_RATE * frame_ms // 1000
+    search = search_seconds * WHISPER_RATE // frame * frame
+    points = [0]
+    while len(pcm) - points[-1] > limit:
+        hi = points[-1] + limit
+        window = pcm[hi - search:hi].astype(np.float32).reshape(-1, frame)
+        points.append(hi - search + int(np.argmin(np.square(window).mean(axis=1))) * frame + frame // 2)
+    points.append(len(pcm))
+    return points
+
+def transcribe_chunk(client, path, retries=4):
+    with span("transcribe_chunk", "transcribe", bytes=os.path.getsize(path)) as info:
+        def call():
+            started = time.perf_counter()
+            with open(path, "rb") as f:
+                text = client.audio.transcriptions.create(model="whisper-1", file=f).text
+            info["api_s"] = round(time.perf_counter() - started, 3)
+            return text
+        return with_retries(call, retries)
+
+def transcribe_file(client, path, max_workers=4):
+    """Transcribes an audio/video file of any length; chunks are encoded and sent in parallel."""
+    with span("decode_for_whisper", "transcribe", bytes=os.path.getsize(path)):
+        pcm = decode_for_whisper(path)
+        points = find_split_points(pcm)
+    with tempfile.TemporaryDirectory() as tmp:
+        def run(i):
+            chunk_path = Path(tmp) / f"chunk_{i}.mp3"
+            seg = AudioSegment(pcm[points[i]:points[i + 1]].tobytes(), frame_rate=WHISPER_RATE, sample_width=2, channels=1)
+            seg.export(chunk_path, format="mp3", bitrate=WHISPER_BITRATE)
+            return transcribe_chunk(client, chunk_path)
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            texts = list(pool.map(carry_context(run), range(len(points) - 1)))
+    return "\n".join(t.strip() for t in texts if t and t.strip())
+
+# ================= RETRIEVAL =================
+# The chat sends only the passages relevant to each question instead of a fixed prefix of
+# the source. A BM25 index is built once per source; embeddings can be blended in.
+CHUNK_CHARS = 1500
+CHUNK_OVERLAP = 200
+RETRIEVAL_TOP_K = 6
+EMBEDDING_MODEL = "text-embedding-3-small"
+TOKEN_RE = re.compile(r"\w+")
+
+def tokenize(text): return TOKEN_RE.findall(text.lower())
+
+def chunk_text(text, chunk_chars=CHUNK_CHARS, overlap=CHUNK_OVERLAP):
+    """Packs paragraphs into chunks of about chunk_chars; oversized paragraphs are hard-split with overlap."""
+    chunks, current = [], ""
+    for para in re.split(r"\n\s*\n|\n", text):
+        para = para.strip()
+        if not para: continue
+        while len(para) > chunk_chars:
+            if current: chunks.append(current); current = ""
+            chunks.append(para[:chunk_chars])
+            para = para[chunk_chars - overlap:]
+        if current and len(current) + len(para) + 1 > chunk_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n{para}" if current else para
+    if current: chunks.append(current)
+    return chunks
+
+def build_chunk_index(text, k1=1.5, b=0.75):
+    """Chunks text and precomputes a sparse (chunks x terms) matrix of BM25 term weights."""
+    from scipy.sparse import csr_matrix
+    chunks = chunk_text(text)
+    vocab, rows, cols = {}, [], []
+    for i, chunk in enumerate(chunks):
+        ids = [vocab.setdefault(t, len(vocab)) for t in tokenize(chunk)]
+        rows.extend([i] * len(ids))
+        cols.extend(ids)
+    tf = csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=(len(chunks), len(vocab))).tocoo()
+    doc_len = np.bincount(tf.row, weights=tf.data, minlength=len(chunks))
+    doc_freq = np.bincount(tf.col, minlength=len(vocab))
+    idf = np.log(1 + (len(chunks) - doc_freq + 0.5) / (doc_freq + 0.5))
+    norm = k1 * (1 - b + b * doc_len[tf.row] / max(doc_len.mean() if len(chunks) else 0, 1))
+    tf.data = (tf.data * (k1 + 1) / (tf.data + norm) * idf[tf.col]).astype(np.float32)
+    return {"chunks": chunks, "vocab": vocab, "weights": tf.tocsc(), "embeddings": None}
+
+def embed_texts(client, texts, batch=128, max_workers=4):
+    """Unit-normalized embedding matrix for texts, batched and requested concurrently."""
+    batches = [texts[i:i + batch] for i in range(0, len(texts), batch)]
+    def run(items):
+        with span("embeddings", "llm", items=len(items), chars=sum(len(t) for t in items)):
+            return [d.embedding for d in with_retries(lambda: client.embeddings.create(model=EMBEDDING_MODEL, input=items)).data]
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        vectors = np.array([v for vs in pool.map(carry_context(run), batches) for v in vs], dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+def search_index(index, query, top_k=RETRIEVAL_TOP_K, client=None):
+    """
+    Indices of the top_k chunks for query, in document order. With embeddings on the index
+    (and a client to embed the query), BM25 and cosine scores are blended 50/50.
+    """
+    n = len(index["chunks"])
+    if n <= top_k: return list(range(n))
+    ids = [index["vocab"][t] for t in set(tokenize(query)) if t in index["vocab"]]
+    scores = np.asarray(index["weights"][:, ids].sum(axis=1)).ravel() if ids else np.zeros(n, dtype=np.float32)
+    if index["embeddings"] is not None and client is not None:
+        if scores.max() > 0: scores = scores / scores.max()
+        scores = 0.5 * scores + 0.5 * (index["embeddings"] @ embed_texts(client, [query])[0])
+    return sorted(np.argsort(-scores, kind="stable")[:top_k].tolist())
+
+CHAT_PREFIX_CHARS = 30000
+
+def chat_messages(source_text, question, index=None, embed_client=None):
+    """
+    Sources up to CHAT_PREFIX_CHARS are sent whole as an unchanging system prefix, which is
+    identical on every turn and so prefix-cached by the provider. Longer sources are answered
+    from the top retrieved chunks of index.
+    """
+    if len(source_text) <= CHAT_PREFIX_CHARS or index is None:
+        return [
+            {"role": "system", "content": f"Answer based ONLY on source text.\n\nSource: {source_text[:CHAT_PREFIX_CHARS]}"},
+            {"role": "user", "content": question}
+        ]
+    try: hits = search_index(index, question, client=embed_client if index["embeddings"] is not None else None)
+    except Exception: hits = search_index(index, question)
+    excerpts = "\n\n".join(f"[{n}] {index['chunks'][i]}" for n, i in enumerate(hits, 1))
+    return [
+        {"role": "system", "content": "Answer based ONLY on the source excerpts. Cite excerpt numbers like [2] where helpful."},
+        {"role": "user", "content": f"Source excerpts:\n{excerpts}"},
+        {"role": "user", "content": question}
+    ]
+
+# ================= SCRIPT GENERATION =================
+SCRIPT_SOURCE_LIMIT = 35000  # characters of source a single script prompt carries
+SECTION_CHARS = 12000
+MAX_OUTLINE_ROUNDS = 3
+EXCHANGES_PER_PART = 16
+LLM_WORKERS = 4
+LENGTH_INSTRUCTIONS = {
+    "Short (2 min)": (15, "12-15 exchanges"),
+    "Medium (5 min)": (30, "30 exchanges. Deep dive."),
+    "Long (15 min)": (50, "50 exchanges. Very detailed."),
+    "Extra Long (30 min)": (80, "80 exchanges. Comprehensive."),
+}
+
+LLM_CACHE_DIR = CACHE_DIR / "llm"
+LLM_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Prompts put the large, stable part (source text) first and the small, variable part
+# (settings, question) last, so providers' automatic prefix caching can reuse it.
+SCRIPT_SYSTEM_PROMPT = """You write podcast scripts from source material.
+Format: JSON { "title": "...", "dialogue": [ {"speaker": "Host 1", "text": "..."}, {"speaker": "Caller", "text": "..."} ] }"""
+
+def script_messages(text, language, length_instr, host1, host2, notes, caller_prompt, part_note=""):
+    call_in_instr = ""
+    if caller_prompt:
+        call_in_instr = f"MANDATORY: Include a 'Caller' speaker who asks: '{caller_prompt}'. Hosts must discuss this."
+    return [
+        {"role": "system", "content": SCRIPT_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Text: {text}"},
+        {"role": "user", "content": f"""
+    Create a podcast script from the text above.
+    {part_note}
+    Language: {language}
+    Length: {length_instr}
+    Host 1: {host1}
+    Host 2: {host2}
+    DIRECTOR NOTES: {notes}
+    {call_in_instr}
+    """}]
+
+def llm_cache_path(client, model, messages, json_mode):
+    payload = json.dumps([str(client.base_url), model, messages, json_mode], ensure_ascii=False)
+    return LLM_CACHE_DIR / f"{hashlib.sha256(payload.encode('utf-8')).hexdigest()}.json"
+
+def cacheable(content, json_mode, finish_reason="stop"):
+    """Only complete answers are cached, and in JSON mode only ones that parse: a bad entry would fail every later hit."""
+    if finish_reason != "stop" or content is None: return False
+    if not json_mode: return True
+    try: json.loads(content)
+    except ValueError: return False
+    return True
+
+def cached_response(path, use_cache, json_mode=False):
+    if not use_cache or _private.get() or not path.exists(): return None
+    content = path.read_text(encoding="utf-8")
+    if not cacheable(content, json_mode):
+        path.unlink(missing_ok=True)
+        return None
+    os.utime(path)
+    return content
+
+def store_response(path, content, json_mode=False, finish_reason="stop"):
+    if _private.get() or not cacheable(content, json_mode, finish_reason): return
+    with write_atomic(path) as tmp: tmp.write_text(content, encoding="utf-8")
+    prune_cache(LLM_CACHE_DIR, LLM_CACHE_MAX_BYTES, "*.json")
+
+def chat_completion(client, model, messages, json_mode=False, use_cache=True):
+    """
+    Completion text, served from the local response cache when the exact same request was
+    made before (use_cache=False forces a fresh answer, which then replaces the cached one).
+    """
+    path = llm_cache_path(client, model, messages, json_mode)
+    prompt_chars = sum(len(m["content"]) for m in messages)
+    with span("chat_completion", "llm", model=model, prompt_chars=prompt_chars) as info:
+        if (content := cached_response(path, use_cache, json_mode)) is not None:
+            info.update(cache="hit", chars=len(content))
+            return content
+        info["cache"] = "miss"
+        kwargs = {"response_format": {"type": "json_object"}} if json_mode else {}
+        choice = with_retries(lambda: client.chat.completions.create(model=model, messages=messages, **kwargs)).choices[0]
+        content = choice.message.content
+        info.update(chars=len(content or ""), finish_reason=choice.finish_reason)
+        store_response(path, content, json_mode, choice.finish_reason)
+        return content
+
+def complete_json(client, model, messages, use_cache=True):
+    return json.loads(chat_completion(client, model, messages, json_mode=True, use_cache=use_cache))
+
+def stream_text(client, model, messages, json_mode=True, use_cache=True):
+    """Yields content deltas of a streamed chat completion; a cache hit arrives as one delta."""
+    path = llm_cache_path(client, model, messages, json_mode)
+    trace, parent = _trace.get(), _span.get()
+    started = time.perf_counter()
+    info = {"model": model, "prompt_chars": sum(len(m["content"]) for m in messages)}
+    # A generator is resumed by its consumer, so the span is recorded by hand rather than with span().
+    record = {"name": "stream_text", "cat": "llm", "start": started - (trace.t0 if trace else 0), "thread": threading.current_thread().name,
+              "parent": parent["id"] if parent else None, "id": f"{id(info):x}.{time.perf_counter_ns()}", "args": info}
+    if (content := cached_response(path, use_cache, json_mode)) is not None:
+        info.update(cache="hit", chars=len(content))
+        yield content
+    else:
+        info["cache"] = "miss"
+        kwargs = {"response_format": {"type": "json_object"}} if json_mode else {}
+        token = _span.set(record)  # retries are noted on this span
+        try: stream = with_retries(lambda: client.chat.completions.create(model=model, messages=messages, stream=True, **kwargs))
+        finally: _span.reset(token)
+        parts, finish_reason = [], None
+        for chunk in stream:
+            if not chunk.choices: continue
+            finish_reason = chunk.choices[0].finish_reason or finish_reason
+            if chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+                if len(parts) == 1: info["first_token_s"] = round(time.perf_counter() - started, 3)
+                yield parts[-1]
+        info.update(chars=sum(len(p) for p in parts), finish_reason=finish_reason)
+        store_response(path, "".join(parts), json_mode, finish_reason)
+    if trace is not None:
+        record["end"] = time.perf_counter() - trace.t0
+        trace.add(record)
+
+def iter_script_events(chunks):
+    """
+    Incrementally parses a streamed {"title", "dialogue": [...]} document.
+    Yields ("title", str) as soon as the title is complete, ("line", dict) for each dialogue
+    entry once its closing brace arrives, and finally ("done", script) with the full parse.
+    """
+    decoder = json.JSONDecoder()
+    buf, pos, title = "", None, None
+    for chunk in chunks:
+        buf += chunk
+        if title is None and (m := re.search(r'"title"\s*:\s*', buf)):
+            try:
+                title = decoder.raw_decode(buf, m.end())[0]
+                yield "title", title
+            except ValueError: pass
+        if pos is None:
+            m = re.search(r'"dialogue"\s*:\s*\[', buf)
+            if not m: continue
+            pos = m.end()
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,": pos += 1
+            if pos >= len(buf) or buf[pos] == "]": break
+            try: line, pos = decoder.raw_decode(buf, pos)
+            except ValueError: break
+            if isinstance(line, dict) and "text" in line: yield "line", line
+    yield "done", json.loads(buf)
+
+def outline_text(client, model, text, language, use_cache=True):
+    messages = [
+        {"role": "user", "content": f"Text: {text}"},
+        {"role": "user", "content": f"""
+    Outline the text above, a section of a larger document, for a podcast writer.
+    List the key facts, figures, arguments, names and memorable quotes as concise bullet points.
+    Write the outline in {language}. Do not add anything that is not in the text.
+    """}]
+    return chat_completion(client, model, messages, use_cache=use_cache).strip()
+
+def outline_source(client, model, text, language, max_workers=LLM_WORKERS, use_cache=True):
+    """
+    Map-reduce: outlines SECTION_CHARS sections concurrently, then re-outlines groups of
+    outlines until the combined outline fits in SCRIPT_SOURCE_LIMIT. Returns outlines in order.
+    After MAX_OUTLINE_ROUNDS, or as soon as a round stops shrinking the outline, every outline
+    is cut to an equal share of the limit instead.
+    """
+    pieces = chunk_text(text, SECTION_CHARS, 0)
+    outline = carry_context(lambda piece: outline_text(client, model, piece, language, use_cache))
+    total = len(text)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for _ in range(MAX_OUTLINE_ROUNDS):
+            outlines = list(pool.map(outline, pieces))
+            size = sum(len(o) for o in outlines)
+            if size <= SCRIPT_SOURCE_LIMIT or len(outlines) == 1: return outlines
+            if size > total * 0.9: break
+            pieces, total = chunk_text("\n\n".join(outlines), SECTION_CHARS, 0), size
+    share = SCRIPT_SOURCE_LIMIT // len(outlines)
+    return [o[:share] for o in outlines]
+
+def generate_script_parts(client, model, outlines, exchanges, language, host1, host2, notes, caller_prompt,
+                          max_workers=LLM_WORKERS, use_cache=True):
+    """
+    Writes the episode as several parts concurrently, each covering a contiguous slice of the
+    outline, and stitches them into one {"title", "dialogue"} script. The call-in goes in the last part.
+    """
+    n = max(1, min(len(outlines), round(exchanges / EXCHANGES_PER_PART)))
+    bounds = [round(k * len(outlines) / n) for k in range(n + 1)]
+    def run(k):
+        if n == 1: note = ""
+        elif k == 0: note = f"This is part 1 of {n}. Open the show, but do NOT wrap up or say goodbye."
+        elif k == n - 1: note = f"This is the final part ({n} of {n}). Continue mid-show without greetings, then wrap up and sign off."
+        else: note = f"This is part {k + 1} of {n}. Continue mid-show: no greetings, no sign-off."
+        messages = script_messages("\n\n".join(outlines[bounds[k]:bounds[k + 1]]), language, f"{max(4, exchanges // n)} exchanges.",
+                                   host1, host2, notes, caller_prompt if k == n - 1 else "", note)
+        return complete_json(client, model, messages, use_cache)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        parts = list(pool.map(carry_context(run), range(n)))
+    return {"title": parts[0].get("title", "Podcast"), "dialogue": [l for part in parts for l in part.get("dialogue", [])]}
+
+
+# ================= PIPELINE API =================
+VOICE_MAP = {"Dynamic (Alloy & Nova)": ("alloy", "nova"), "Calm (Onyx & Shimmer)": ("onyx", "shimmer"), "Formal (Echo & Fable)": ("echo", "fable")}
+MUSIC_URLS = {
+    "Lo-Fi (Study)": "https://cdn.pixabay.com/download/audio/2022/05/27/audio_1808fbf07a.mp3?filename=lofi-study-112191.mp3",
+    "Upbeat (Morning)": "https://cdn.pixabay.com/download/audio/2024/05/24/audio_95e3f5f471.mp3?filename=good-morning-206098.mp3",
+    "Ambient (News)": "https://cdn.pixabay.com/download/audio/2022/03/10/audio_c8c8a73467.mp3?filename=ambient-piano-10226.mp3",
+    "Cinematic (Deep)": "https://cdn.pixabay.com/download/audio/2022/03/22/audio_c2b86c77ce.mp3?filename=cinematic-atmosphere-score-2-21266.mp3"
+}
+
+# Everything an episode depends on besides the source and the API clients. music is a
+# MUSIC_URLS preset name or a URL; music_file, intro_file and outro_file are paths or uploads.
+DEFAULT_SETTINGS = {
+    "language": "English (US)",
+    "length_option": "Short (2 min)",
+    "host1": "Male, curious, slightly skeptical",
+    "host2": "Female, enthusiastic expert, fast talker",
+    "instructions": "",
+    "caller_prompt": "",
+    "voice_style": "Dynamic (Alloy & Nova)",
+    "music": None,
+    "music_file": None,
+    "intro_file": None,
+    "outro_file": None,
+    "music_ramp_up": False,
+    "duck_music": True,
+    "normalize": True,
+    "tts_workers": 4,
+    "progressive": False,
+}
+
+def load_source(source, audio_client=None, on_issue=None):
+    """
+    Source text for {"text": str}, {"url": str}, {"urls": [str]}, {"video": str} or {"files": [paths or uploads]}.
+    A URL may be a page, a sitemap or an RSS/Atom feed.
+    Raises ValueError when nothing could be loaded.
+    """
+    if "text" in source: text = source["text"]
+    elif "url" in source or "urls" in source:
+        urls = source.get("urls") or [source["url"]]
+        articles = []
+        for url, article, err in iter_web_articles(urls):
+            if err is not None: (on_issue or (lambda level, message: None))("warning", f"Skipped {url}: {err}")
+            else: articles.append(article_text(url, article))
+        text = "".join(articles)
+        if not text: raise ValueError(f"Could not fetch {', '.join(urls)}")
+    elif "video" in source:
+        if not audio_client: raise ValueError("OpenAI API Key Required for Transcription.")
+        text, err = download_and_transcribe_video(source["video"], audio_client)
+        if not text: raise ValueError(err)
+    elif "files" in source: text = extract_text_from_files(source["files"], audio_client, on_issue)
+    else: raise ValueError(f"Unknown source: {sorted(source)}")
+    if not text.strip(): raise ValueError("Source is empty.")
+    return text
+
+def write_script(client, model, source_text, settings, full_coverage=None, parallel_parts=True,
+                 use_cache=True, complete=None, on_stage=None):
+    """
+    {"title", "dialogue"} script for source_text. Sources over SCRIPT_SOURCE_LIMIT are outlined
+    first unless full_coverage=False, and then written in parallel parts if parallel_parts.
+    complete(messages) -> script replaces the single-prompt completion (the Studio streams it).
+    """
+    s = {**DEFAULT_SETTINGS, **settings}
+    stage = on_stage or (lambda message: None)
+    with span("write_script", "llm", model=model, source_chars=len(source_text)):
+        exchanges, length_instr = LENGTH_INSTRUCTIONS[s["length_option"]]
+        if full_coverage is None: full_coverage = len(source_text) > SCRIPT_SOURCE_LIMIT
+        text = source_text[:SCRIPT_SOURCE_LIMIT]
+        if full_coverage:
+            stage(f"Outlining source in sections using {model}...")
+            outlines = outline_source(client, model, source_text, s["language"], use_cache=use_cache)
+            if parallel_parts:
+                stage(f"Drafting Script using {model}...")
+                return generate_script_parts(client, model, outlines, exchanges, s["language"], s["host1"], s["host2"],
+                                             s["instructions"], s["caller_prompt"], use_cache=use_cache)
+            text = "\n\n".join(outlines)
+        stage(f"Drafting Script using {model}...")
+        messages = script_messages(text, s["language"], length_instr, s["host1"], s["host2"], s["instructions"], s["caller_prompt"])
+        if complete: return complete(messages)
+        return complete_json(client, model, messages, use_cache)
+
+def episode_layout(settings):
+    """build_timeline arguments for settings. Music, intro and outro that fail to load are left out."""
+    s = {**DEFAULT_SETTINGS, **settings}
+    with span("episode_layout", "mix"): return _episode_layout(s)
+
+def _episode_layout(s):
+    bed = intro = outro = None
+    try:
+        if s["music"]: bed = url_asset_pcm(MUSIC_URLS.get(s["music"], s["music"]))
+        elif s["music_file"]: bed = file_asset_pcm(s["music_file"])
+    except: pass
+
+    try:
+        if s["intro_file"]: intro = file_asset_pcm(s["intro_file"])
+        if s["outro_file"]: outro = file_asset_pcm(s["outro_file"])
+    except: pass
+
+    layout = {"bed": bed, "intro": intro, "outro": outro, "lead_in_ms": 5000 if s["music_ramp_up"] else 0}
+    if s["duck_music"]: layout.update(bed_gain_db=-12, duck_db=-10)
+    return layout
+
+def produce_episode(audio_client, dialogue, settings, out_dir, on_progress=None, on_chapter=None):
+    """
+    Records and mixes dialogue into out_dir/podcast.mp3. Returns (path or None, {"hits", "misses"}).
+    on_progress(done, total, stats) is called after each recorded line; with settings["progressive"]
+    the episode is also published in parts through on_chapter (see export_progressive).
+    """
+    s = {**DEFAULT_SETTINGS, **settings}
+    with span("produce_episode", "pipeline", lines=len(dialogue)):
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        layout = episode_layout(s)
+        script = merge_dialogue_lines(dialogue)
+        tts_stats = {"hits": 0, "misses": 0}
+
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = Path(tmp)
+
+            def decode_line(i, line, f_path):
+                """Runs on the TTS workers. Decoded lines are parked on disk and memory-mapped, so RAM never holds the whole dialogue."""
+                pcm = load_pcm(f_path, channels=1)
+                if line['speaker'] == "Caller": pcm = phone_filter(pcm)
+                np.save(tmp_path / f"voice_{i}.npy", pcm)
+                return np.load(tmp_path / f"voice_{i}.npy", mmap_mode="r")
+
+            def ready_voices():
+                for done, (i, pcm, stats) in enumerate(iter_dialogue_audio(audio_client, script, VOICE_MAP[s["voice_style"]], s["tts_workers"], decode_line), 1):
+                    tts_stats.update(stats)
+                    if on_progress: on_progress(done, len(script), tts_stats)
+                    yield i, pcm
+
+            if s["progressive"]:
+                return export_progressive(ready_voices(), layout, out_dir, s["normalize"], on_chapter, len(script)), tts_stats
+            voices = [None] * len(script)
+            for i, pcm in ready_voices(): voices[i] = pcm
+            voices = [v for v in voices if v is not None]
+            if not voices: return None, tts_stats
+            episode = out_dir / "podcast.mp3"
+            with span("build_timeline", "mix", lines=len(voices)): timeline = build_timeline(voices, **layout)
+            export_mp3(timeline, episode, normalize=s["normalize"])
+        return episode, tts_stats
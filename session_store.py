@@ -0,0 +1,180 @@
+"""
+Off-heap session storage for PodcastLM Studio.
+
+The large per-session artifacts (source text, script, chat history, notebook) live in SQLite as
+compressed blobs instead of in Streamlit's session_state, so server RAM does not grow with every
+connected user and a session survives a server restart. Reads go through one process-wide LRU
+with a byte budget: active sessions stay in memory, idle ones cost nothing until they come back.
+Compression is zstd when the zstandard package is installed, zlib otherwise.
+The database lives in ~/.podcastlm (set PODCASTLM_DATA_DIR to move it), not in the temp dir,
+which is often RAM-backed or wiped on reboot.
+"""
+import os
+import copy
+import json
+import time
+import zlib
+import sqlite3
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+from collections import OrderedDict
+
+try: import zstandard
+except ImportError: zstandard = None
+
+SESSION_MAX_BYTES = 64 * 1024 * 1024    # uncompressed artifacts per session
+STORE_MAX_BYTES = 2 * 1024 * 1024 * 1024  # compressed, all sessions; least recently used sessions go first
+SESSION_TTL_DAYS = 30
+HOT_CACHE_BYTES = 128 * 1024 * 1024     # decoded artifacts kept in RAM, all sessions together
+PRUNE_EVERY_PUTS = 200
+DATA_DIR = Path(os.environ.get("PODCASTLM_DATA_DIR") or Path.home() / ".podcastlm")
+SESSION_DB = DATA_DIR / "sessions.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, created REAL NOT NULL, touched REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS artifacts (
+    session TEXT NOT NULL, name TEXT NOT NULL, codec TEXT NOT NULL,
+    raw_bytes INTEGER NOT NULL, data BLOB NOT NULL, updated REAL NOT NULL,
+    PRIMARY KEY (session, name));
+CREATE INDEX IF NOT EXISTS sessions_touched ON sessions (touched);
+"""
+
+class SessionFull(ValueError):
+    """Raised by put() when an artifact would take a session over its size limit."""
+
+def compress(data):
+    if zstandard: return "zstd", zstandard.ZstdCompressor(level=3).compress(data)
+    return "zlib", zlib.compress(data, 6)
+
+def decompress(codec, data):
+    if codec == "zstd":
+        if zstandard is None: raise RuntimeError("Session data is zstd-compressed but zstandard is not installed.")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+_MISSING = object()
+
+class SessionStore:
+    """Artifacts are JSON values addressed by (session id, name). get() and put() copy, so callers never share the cached object."""
+    def __init__(self, path, session_max_bytes=SESSION_MAX_BYTES, store_max_bytes=STORE_MAX_BYTES,
+                 ttl_days=SESSION_TTL_DAYS, hot_bytes=HOT_CACHE_BYTES):
+        self.path = Path(path)
+        self.session_max_bytes, self.store_max_bytes = session_max_bytes, store_max_bytes
+        self.ttl_days, self.hot_bytes = ttl_days, hot_bytes
+        self.hot, self.hot_size = OrderedDict(), 0
+        self.puts = 0
+        self.lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.db() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(SCHEMA)
+        self.prune()
+
+    @contextmanager
+    def db(self):
+        """A short-lived connection per operation; SQLite connections must not cross Streamlit's script threads."""
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            db.execute("PRAGMA synchronous=NORMAL")
+            with db: yield db
+        finally: db.close()
+
+    # ----- hot cache -----
+
+    def _remember(self, key, value, size):
+        with self.lock:
+            if key in self.hot: self.hot_size -= self.hot.pop(key)[1]
+            if size > self.hot_bytes: return
+            self.hot[key] = (value, size)
+            self.hot_size += size
+            while self.hot_size > self.hot_bytes: self.hot_size -= self.hot.popitem(last=False)[1][1]
+
+    def _forget(self, session, names=None):
+        with self.lock:
+            for key in [k for k in self.hot if k[0] == session and (names is None or k[1] in names)]:
+                self.hot_size -= self.hot.pop(key)[1]
+
+    # ----- sessions -----
+
+    def exists(self, session):
+        with self.db() as db: return db.execute("SELECT 1 FROM sessions WHERE id = ?", (session,)).fetchone() is not None
+
+    def touch(self, session):
+        now = time.time()
+        with self.db() as db:
+            db.execute("INSERT INTO sessions (id, created, touched) VALUES (?, ?, ?) ON CONFLICT(id) DO UPDATE SET touched = excluded.touched",
+                       (session, now, now))
+
+    def size(self, session):
+        """Uncompressed bytes stored for session."""
+        with self.db() as db:
+            return db.execute("SELECT COALESCE(SUM(raw_bytes), 0) FROM artifacts WHERE session = ?", (session,)).fetchone()[0]
+
+    def delete(self, session, names=None):
+        """Drops the named artifacts, or all of them (the session itself is kept)."""
+        with self.db() as db:
+            if names is None: db.execute("DELETE FROM artifacts WHERE session = ?", (session,))
+            else: db.executemany("DELETE FROM artifacts WHERE session = ? AND name = ?", [(session, n) for n in names])
+        self._forget(session, names)
+
+    def prune(self):
+        """Expires sessions idle for ttl_days, then drops least recently used sessions until the store fits store_max_bytes."""
+        with self.db() as db:
+            expired = [row[0] for row in db.execute("SELECT id FROM sessions WHERE touched < ?", (time.time() - self.ttl_days * 86400,))]
+            total = db.execute("SELECT COALESCE(SUM(LENGTH(data)), 0) FROM artifacts").fetchone()[0]
+            if total > self.store_max_bytes:
+                sizes = db.execute("SELECT s.id, COALESCE(SUM(LENGTH(a.data)), 0) FROM sessions s LEFT JOIN artifacts a ON a.session = s.id "
+                                   "GROUP BY s.id ORDER BY s.touched").fetchall()
+                total -= sum(size for session, size in sizes if session in expired)
+                for session, size in sizes:
+                    if total <= self.store_max_bytes: break
+                    if session not in expired:
+                        expired.append(session)
+                        total -= size
+            for session in expired:
+                db.execute("DELETE FROM artifacts WHERE session = ?", (session,))
+                db.execute("DELETE FROM sessions WHERE id = ?", (session,))
+        for session in expired: self._forget(session)
+
+    # ----- artifacts -----
+
+    def get(self, session, name, default=None):
+        key = (session, name)
+        with self.lock:
+            if key in self.hot:
+                self.hot.move_to_end(key)
+                value = self.hot[key][0]
+                return default if value is _MISSING else copy.deepcopy(value)
+        with self.db() as db:
+            row = db.execute("SELECT codec, data, raw_bytes FROM artifacts WHERE session = ? AND name = ?", key).fetchone()
+        if row is None:
+            self._remember(key, _MISSING, 0)
+            return default
+        value = json.loads(decompress(row[0], row[1]))
+        self._remember(key, value, row[2])
+        return copy.deepcopy(value)
+
+    def put(self, session, name, value):
+        """
+        Stores value (anything JSON can hold) and keeps it hot. Raises SessionFull, storing nothing,
+        if the session's artifacts would exceed session_max_bytes uncompressed.
+        Every PRUNE_EVERY_PUTS writes the store is pruned, so a long-running server stays within its limits.
+        """
+        raw = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        codec, data = compress(raw)
+        now = time.time()
+        with self.db() as db:
+            others = db.execute("SELECT COALESCE(SUM(raw_bytes), 0) FROM artifacts WHERE session = ? AND name != ?", (session, name)).fetchone()[0]
+            if others + len(raw) > self.session_max_bytes:
+                raise SessionFull(f"Session storage limit reached: {name} ({len(raw) / 1e6:.1f} MB) would bring this session to "
+                                  f"{(others + len(raw)) / 1e6:.1f} MB (limit {self.session_max_bytes / 1e6:.0f} MB).")
+            db.execute("INSERT OR REPLACE INTO artifacts (session, name, codec, raw_bytes, data, updated) VALUES (?, ?, ?, ?, ?, ?)",
+                       (session, name, codec, len(raw), data, now))
+            db.execute("INSERT INTO sessions (id, created, touched) VALUES (?, ?, ?) ON CONFLICT(id) DO UPDATE SET touched = excluded.touched",
+                       (session, now, now))
+        self._remember((session, name), copy.deepcopy(value), len(raw))
+        with self.lock:
+            self.puts += 1
+            due = self.puts % PRUNE_EVERY_PUTS == 0
+        if due: self.prune()
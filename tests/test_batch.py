@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+import podcast_batch
+
+SCRIPT = {"title": "T", "dialogue": [{"speaker": "Host 1", "text": "hi"}]}
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    """Two text jobs and no API keys: a job can only finish from stages already on disk."""
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    monkeypatch.delenv("XAI_API_KEY", raising=False)
+    jobs = tmp_path / "jobs.jsonl"
+    jobs.write_text("\n".join(json.dumps({"id": i, "source": {"text": f"source {i}"}}) for i in ("a", "b")) + "\n", encoding="utf-8")
+    return jobs, tmp_path / "out"
+
+def finish_stages(job_dir):
+    job_dir.mkdir(parents=True, exist_ok=True)
+    (job_dir / "script.json").write_text(json.dumps(SCRIPT), encoding="utf-8")
+    (job_dir / "podcast.mp3").write_bytes(b"mp3")
+
+def run(jobs, out, *flags): return podcast_batch.main([str(jobs), "--out", str(out), "--workers", "1", *flags])
+
+def statuses(out): return {k: v["status"] for k, v in json.loads((out / "jobs.json").read_text(encoding="utf-8")).items()}
+
+def test_finished_stages_are_skipped(queue):
+    jobs, out = queue
+    finish_stages(out / "a")
+    assert run(jobs, out) == 1
+    assert statuses(out) == {"a": "done", "b": "failed"}
+    assert (out / "a" / "source.txt").read_text(encoding="utf-8") == "source a"
+    assert (out / "b" / "source.txt").exists() and not (out / "b" / "script.json").exists()
+    assert json.loads((out / "b" / "trace.json").read_text(encoding="utf-8"))["traceEvents"]
+    assert "Missing OpenAI API Key" in json.loads((out / "jobs.json").read_text(encoding="utf-8"))["b"]["error"]
+
+def test_failed_jobs_rerun_only_when_asked(queue, capsys):
+    jobs, out = queue
+    finish_stages(out / "a")
+    run(jobs, out)
+    (out / "b" / "source.txt").write_text("edited", encoding="utf-8")
+    finish_stages(out / "b")
+    assert run(jobs, out) == 0
+    assert "0 job(s) to run" in capsys.readouterr().out
+    assert statuses(out)["b"] == "failed"
+    assert run(jobs, out, "--retry-failed") == 0
+    assert statuses(out) == {"a": "done", "b": "done"}
+    assert (out / "b" / "source.txt").read_text(encoding="utf-8") == "edited"  # a finished stage is never redone
+
+def test_load_jobs(tmp_path):
+    path = tmp_path / "jobs.jsonl"
+    path.write_text('{"source": {"text": "x"}}\n\n{"id": "x", "source": {"text": "y"}}\n', encoding="utf-8")
+    assert [job["id"] for job in podcast_batch.load_jobs(path)] == ["job001", "x"]
+    path.write_text('{"id": "x", "source": {}}\n{"id": "x", "source": {}}\n', encoding="utf-8")
+    with pytest.raises(ValueError): podcast_batch.load_jobs(path)
@@ -0,0 +1,48 @@
+import os
+import signal
+import time
+
+import pytest
+
+import doc_extract
+from doc_extract import iter_document_text, get_pool, cache_path
+
+DOCS = [(0, "a.txt", b"first"), (1, "b.txt", "zweite ü".encode())]
+
+def test_extract_and_cache(tmp_path):
+    assert list(iter_document_text(DOCS, tmp_path)) == [(0, "first\n", None), (1, "zweite ü\n", None)]
+    assert cache_path(b"first", tmp_path).read_text(encoding="utf-8") == "first\n"
+    assert list(iter_document_text(DOCS[:1], tmp_path)) == [(0, "first\n", None)]
+
+def test_extract_without_cache(tmp_path):
+    assert list(iter_document_text(DOCS, None)) == [(0, "first\n", None), (1, "zweite ü\n", None)]
+    assert not list(tmp_path.iterdir())
+
+def test_bad_document_reports_error(tmp_path):
+    out = list(iter_document_text([(0, "bad.txt", b"\xff\xfe\xfa"), (1, "ok.txt", b"ok")], tmp_path))
+    assert out[0][0] == 0 and out[0][1] is None and isinstance(out[0][2], UnicodeDecodeError)
+    assert out[1] == (1, "ok\n", None)
+
+@pytest.mark.skipif(not hasattr(signal, "SIGKILL"), reason="needs SIGKILL")
+def test_recovers_from_broken_pool(tmp_path):
+    """A worker killed (e.g. by the OOM killer) must not break every later extraction."""
+    pool = get_pool()
+    list(pool.map(abs, range(4)))
+    os.kill(next(iter(pool._processes)), signal.SIGKILL)
+    time.sleep(0.5)
+    assert list(iter_document_text([(0, "a.txt", b"after kill")], tmp_path)) == [(0, "after kill\n", None)]
+    assert doc_extract._pool is not pool
+    assert list(iter_document_text([(1, "b.txt", b"and again")], tmp_path)) == [(1, "and again\n", None)]
+
+def test_private_extraction_skips_the_cache(tmp_path, monkeypatch):
+    import podcast_pipeline as pp
+    monkeypatch.setattr(pp, "EXTRACT_CACHE_DIR", tmp_path / "extract")
+    (tmp_path / "a.txt").write_bytes(b"secret")
+    (tmp_path / "b.xyz").write_bytes(b"?")
+    issues = []
+    with pp.private():
+        assert pp.extract_text_from_files([tmp_path / "a.txt", tmp_path / "b.xyz"], on_issue=lambda *a: issues.append(a)) == "secret\n"
+    assert not (tmp_path / "extract").exists()
+    assert issues == [("warning", "Skipped b.xyz: Unsupported format.")]
+    assert pp.extract_text_from_files([tmp_path / "a.txt"]) == "secret\n"
+    assert len(list((tmp_path / "extract").iterdir())) == 1
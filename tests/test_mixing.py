@@ -0,0 +1,145 @@
+import numpy as np
+import pytest
+
+import podcast_pipeline as pp
+
+def voices(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return [(0.3 * rng.standard_normal((int(pp.MIX_RATE * rng.uniform(0.4, 2.5)), 1))).astype(np.float32) for _ in range(n)]
+
+LAYOUTS = [
+    {},
+    {"bed": "loop", "bed_gain_db": -12, "duck_db": -10, "lead_in_ms": 1000},
+    {"bed": "loop", "intro": "intro", "outro": "outro"},
+    {"bed": "short", "bed_fade_ms": 6000},
+]
+
+def layout(spec):
+    rng = np.random.default_rng(1)
+    clips = {"loop": 4, "short": 1, "intro": 1.5, "outro": 1}
+    return {k: (0.1 * rng.standard_normal((int(pp.MIX_RATE * clips[v]), 2))).astype(np.float32) if v in clips else v
+            for k, v in spec.items()}
+
+# ================= TIMELINE =================
+
+def test_timeline_layout():
+    lines, args = voices(3), layout({"intro": "intro", "outro": "outro"})
+    timeline = pp.build_timeline(lines, gap_ms=350, **args)
+    gap, pos = pp.ms_to_frames(350), len(args["intro"])
+    for (start, stop), pcm in zip(timeline["speech"], lines):
+        assert (start, stop) == (pos, pos + len(pcm))
+        pos = stop + gap
+    assert timeline["length"] == pos + len(args["outro"])
+
+def test_render_places_voices():
+    lines = voices(2)
+    timeline = pp.build_timeline(lines)
+    out = pp.render_timeline(timeline)
+    assert out.shape == (timeline["length"], pp.MIX_CHANNELS)
+    for (start, stop), pcm in zip(timeline["speech"], lines):
+        np.testing.assert_array_equal(out[start:stop], np.broadcast_to(pcm, (len(pcm), pp.MIX_CHANNELS)))
+    assert not out[timeline["speech"][0][1]:timeline["speech"][1][0]].any()
+
+def test_bed_is_tiled_and_faded():
+    bed = np.ones((pp.MIX_RATE // 2, 2), dtype=np.float32)
+    lines = [np.zeros((pp.MIX_RATE * 3, 1), dtype=np.float32)]
+    timeline = pp.build_timeline(lines, bed=bed, bed_gain_db=-20, bed_tail_ms=2000, bed_fade_ms=1000)
+    out = pp.render_timeline(timeline)
+    assert timeline["length"] > 6 * len(bed)
+    np.testing.assert_allclose(out[:-pp.ms_to_frames(1000)], pp.db_to_gain(-20), rtol=1e-6)
+    fade = out[-pp.ms_to_frames(1000):, 0]
+    assert np.all(np.diff(fade) <= 0) and fade[-1] < 0.001
+
+@pytest.mark.parametrize("spec", LAYOUTS)
+def test_render_range_matches_whole(spec):
+    timeline = pp.build_timeline(voices(4), **layout(spec))
+    whole = pp.render_timeline(timeline)
+    for start, stop in [(0, 100), (12345, 50000), (timeline["length"] - 10, timeline["length"] + 10)]:
+        np.testing.assert_allclose(pp.render_timeline(timeline, start, stop), whole[start:stop], atol=1e-3)  # the duck envelope is interpolated per range
+
+# ================= EFFECTS =================
+
+def tone(hz, seconds=1.0, amplitude=0.5, channels=1):
+    t = np.arange(int(pp.MIX_RATE * seconds)) / pp.MIX_RATE
+    return np.repeat((amplitude * np.sin(2 * np.pi * hz * t))[:, None], channels, axis=1).astype(np.float32)
+
+def rms(pcm): return float(np.sqrt(np.mean(np.square(pcm[len(pcm) // 2:]))))
+
+def test_phone_filter_passes_the_voice_band():
+    assert rms(pp.phone_filter(tone(1000))) == pytest.approx(rms(tone(1000)), rel=0.05)
+    assert rms(pp.phone_filter(tone(50))) < 0.01 * rms(tone(50))
+    assert rms(pp.phone_filter(tone(10000))) < 0.01 * rms(tone(10000))
+
+def test_duck_envelope():
+    speech = [(pp.ms_to_frames(1000), pp.ms_to_frames(2000))]
+    env = pp.duck_envelope(speech, 0, pp.ms_to_frames(4000), -10)
+    ducked = pp.db_to_gain(-10)
+    assert env[pp.ms_to_frames(1500)] == pytest.approx(ducked, rel=1e-4)
+    assert env[pp.ms_to_frames(500)] == pytest.approx(1.0)   # before the attack
+    assert env[pp.ms_to_frames(3000)] == pytest.approx(1.0)  # after the release
+    assert env.min() >= ducked - 1e-6 and env.max() <= 1.0 + 1e-6
+    attack = env[pp.ms_to_frames(850):pp.ms_to_frames(1000)]
+    assert np.all(np.diff(attack) <= 1e-7)
+
+def test_duck_envelope_without_speech():
+    assert np.all(pp.duck_envelope([], 0, 100, -10) == 1.0)
+
+def test_loudness_gain_reaches_the_target():
+    pcm = tone(1000, seconds=5, amplitude=0.05, channels=2)
+    blocks = np.array_split(pcm, 7)
+    gain = pp.loudness_gain(pp.measure_loudness(iter(blocks)), float(np.abs(pcm).max()))
+    assert pp.measure_loudness(iter([pcm * gain])) == pytest.approx(-16.0, abs=0.1)
+    assert pp.measure_loudness(iter(blocks)) == pytest.approx(pp.measure_loudness(iter([pcm])), abs=1e-3)
+
+def test_loudness_gain_respects_the_ceiling():
+    pcm = np.zeros((pp.MIX_RATE * 5, 2), dtype=np.float32)
+    pcm[::pp.MIX_RATE] = 0.9  # quiet overall, with loud clicks
+    gain = pp.loudness_gain(pp.measure_loudness(iter([pcm])), 0.9)
+    assert gain == pytest.approx(pp.db_to_gain(-1.0) / 0.9)
+    assert pp.loudness_gain(float("-inf"), 0.0) == 1.0
+
+# ================= RENDERING =================
+
+def test_timeline_blocks_match_whole_render():
+    timeline = pp.build_timeline(voices(5), **layout({"bed": "loop", "duck_db": -10, "intro": "intro", "outro": "outro"}))
+    whole = pp.render_timeline(timeline)
+    blocks = list(pp.iter_rendered(timeline, block_seconds=1))
+    assert max(len(b) for b in blocks) == pp.MIX_RATE
+    np.testing.assert_allclose(np.concatenate(blocks), whole, atol=1e-3)
+
+def test_pcm_bytes_clips_to_int16():
+    block = np.array([[0.5, -0.5], [2.0, -2.0]], dtype=np.float32)
+    assert np.frombuffer(pp.pcm_bytes(block.copy()), dtype=np.int16).tolist() == [16383, -16383, 32767, -32767]
+    assert np.frombuffer(pp.pcm_bytes(block.copy(), 0.5), dtype=np.int16).tolist()[:2] == [8191, -8191]
+
+# ================= PROGRESSIVE EXPORT =================
+
+@pytest.mark.parametrize("spec", LAYOUTS)
+def test_partial_timeline_settles_like_final(spec):
+    """Frames before "settled" of every partial timeline render exactly as in the finished episode."""
+    args, lines = layout(spec), voices(8)
+    final = pp.build_timeline(lines, **args)
+    for n in range(1, len(lines) + 1):
+        part = pp.build_timeline(lines[:n], final=False, **args)
+        settled = part["settled"]
+        assert settled <= part["speech"][-1][1]
+        np.testing.assert_array_equal(pp.render_timeline(part, 0, settled), pp.render_timeline(final, 0, settled))
+
+def test_partial_timeline_stops_before_the_fade():
+    args, lines = layout({"bed": "loop"}), voices(3)
+    part = pp.build_timeline(lines, final=False, **args)
+    final = pp.build_timeline(lines, **args)
+    end = part["speech"][-1][1]
+    assert part["settled"] < end
+    assert not np.array_equal(pp.render_timeline(part, 0, end), pp.render_timeline(final, 0, end))
+
+def test_limit_peaks():
+    ceiling = pp.db_to_gain(-1.0)
+    quiet = np.full((100, 2), 0.1, dtype=np.float32)
+    out, gain = pp.limit_peaks(quiet.copy(), 2.0)
+    assert gain == 2.0 and np.allclose(out, 0.2)
+    loud = np.concatenate([np.full((50, 2), 0.1), np.full((50, 2), 0.5)]).astype(np.float32)
+    out, gain = pp.limit_peaks(loud, 4.0)
+    assert np.abs(out).max() <= ceiling + 1e-6
+    assert gain == pytest.approx(ceiling / 0.5)
+    assert np.all(np.diff(out[:50, 0]) <= 1e-7)  # ramped down, no step
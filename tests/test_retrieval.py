@@ -0,0 +1,46 @@
+import numpy as np
+
+import podcast_pipeline as pp
+
+TOPICS = ["volcano lava eruption magma", "violin orchestra symphony concert", "glacier ice melting arctic",
+          "bread flour yeast oven", "satellite orbit rocket launch", "honeybee hive pollen nectar"]
+
+def source(repeat=40):
+    """Paragraphs that each talk about one topic, in a fixed rotation."""
+    return "\n\n".join(f"Paragraph {i} is about {TOPICS[i % len(TOPICS)]}. " + "It goes on at some length. " * 8 for i in range(repeat))
+
+def test_chunk_text_packs_paragraphs():
+    text = source()
+    chunks = pp.chunk_text(text, chunk_chars=600)
+    assert all(len(c) <= 600 for c in chunks)
+    assert "".join("".join(chunks).split()) == "".join(text.split())
+    assert len(chunks) < len(text.split("\n\n"))
+
+def test_chunk_text_splits_long_paragraphs_with_overlap():
+    para = "".join(chr(65 + i % 26) for i in range(2500))
+    chunks = pp.chunk_text(f"short\n\n{para}\n\ntail", chunk_chars=1000, overlap=100)
+    assert chunks[0] == "short"
+    assert chunks[1] == para[:1000] and chunks[2] == para[900:1900]
+    assert chunks[-1].endswith("tail")
+
+def test_search_finds_the_topic():
+    index = pp.build_chunk_index(source())
+    assert len(index["chunks"]) > pp.RETRIEVAL_TOP_K
+    hits = pp.search_index(index, "When did the VOLCANO erupt?")
+    assert len(hits) == pp.RETRIEVAL_TOP_K and hits == sorted(hits)
+    assert all("volcano" in index["chunks"][i] for i in hits)
+
+def test_search_small_and_unmatched():
+    index = pp.build_chunk_index("one paragraph\n\nanother")
+    assert pp.search_index(index, "anything") == list(range(len(index["chunks"])))
+    index = pp.build_chunk_index(source())
+    assert len(pp.search_index(index, "zzz qqq")) == pp.RETRIEVAL_TOP_K
+
+def test_chat_messages_use_excerpts_for_long_sources():
+    short = pp.chat_messages("tiny source", "q?")
+    assert "tiny source" in short[0]["content"] and short[-1]["content"] == "q?"
+    text = source(400)
+    assert len(text) > pp.CHAT_PREFIX_CHARS
+    long = pp.chat_messages(text, "honeybee pollen?", pp.build_chunk_index(text))
+    assert len(long) == 3 and long[-1]["content"] == "honeybee pollen?"
+    assert long[1]["content"].count("honeybee") >= pp.RETRIEVAL_TOP_K and len(long[1]["content"]) < pp.CHAT_PREFIX_CHARS
@@ -0,0 +1,153 @@
+import json
+import types
+
+import pytest
+
+import podcast_pipeline as pp
+
+class FakeLLM:
+    """Chat completions from reply(messages), streamed in small deltas when asked to."""
+    base_url = "fake"
+
+    def __init__(self, reply, finish_reason="stop"):
+        self.reply, self.finish_reason, self.calls = reply, finish_reason, []
+        self.chat = types.SimpleNamespace(completions=self)
+
+    def create(self, model, messages, stream=False, **kwargs):
+        self.calls.append(messages)
+        content = self.reply(messages)
+        if not stream:
+            return types.SimpleNamespace(choices=[types.SimpleNamespace(message=types.SimpleNamespace(content=content), finish_reason=self.finish_reason)])
+        chunk = lambda delta, finish: types.SimpleNamespace(choices=[types.SimpleNamespace(delta=types.SimpleNamespace(content=delta), finish_reason=finish)])
+        return iter([chunk(content[i:i + 4], None) for i in range(0, len(content), 4)] + [chunk(None, self.finish_reason)])
+
+@pytest.fixture(autouse=True)
+def llm_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(pp, "LLM_CACHE_DIR", tmp_path / "llm")
+    return tmp_path / "llm"
+
+# ================= OUTLINES =================
+
+def section(messages): return messages[0]["content"][len("Text: "):]
+
+def long_source(lines=200): return "".join(f"line{i:03d} " + "word " * 198 + "\n" for i in range(lines))  # 200,000 characters
+
+def test_outline_fits_in_one_round():
+    llm = FakeLLM(lambda m: "- " + section(m)[:100])
+    outlines = pp.outline_source(llm, "m", long_source(), "English")
+    assert len(llm.calls) == len(outlines) == len(pp.chunk_text(long_source(), pp.SECTION_CHARS, 0))
+    assert all(o.startswith("- line") for o in outlines)
+
+def test_outline_rounds_until_it_fits():
+    llm = FakeLLM(lambda m: section(m)[:len(section(m)) // 3])
+    outlines = pp.outline_source(llm, "m", long_source(), "English")
+    assert sum(len(o) for o in outlines) <= pp.SCRIPT_SOURCE_LIMIT
+    assert len(llm.calls) > len(pp.chunk_text(long_source(), pp.SECTION_CHARS, 0))
+
+def test_outline_stops_when_it_does_not_shrink():
+    """A model that echoes its input would otherwise re-outline forever."""
+    llm = FakeLLM(section)
+    outlines = pp.outline_source(llm, "m", long_source(), "English")
+    assert len(llm.calls) == len(pp.chunk_text(long_source(), pp.SECTION_CHARS, 0))
+    assert sum(len(o) for o in outlines) <= pp.SCRIPT_SOURCE_LIMIT
+
+def test_outline_rounds_are_bounded(monkeypatch):
+    monkeypatch.setattr(pp, "MAX_OUTLINE_ROUNDS", 2)
+    llm = FakeLLM(lambda m: section(m)[:int(len(section(m)) * 0.8)])
+    outlines = pp.outline_source(llm, "m", long_source(), "English")
+    assert sum(len(o) for o in outlines) <= pp.SCRIPT_SOURCE_LIMIT
+    first = len(pp.chunk_text(long_source(), pp.SECTION_CHARS, 0))
+    assert first < len(llm.calls) <= 2 * first
+
+# ================= SCRIPT STREAMING =================
+
+SCRIPT = {"title": "Budget {Day}", "dialogue": [
+    {"speaker": "Host 1", "text": "Welcome back, \"everyone\"."},
+    {"speaker": "Host 2", "text": "Today: braces } and ] in text."},
+    {"speaker": "Caller", "text": "Why now?"},
+]}
+
+def events(chunks):
+    return list(pp.iter_script_events(chunks))
+
+@pytest.mark.parametrize("size", [1, 3, 7, 1000])
+def test_script_events_chunked(size):
+    doc = json.dumps(SCRIPT)
+    out = events(doc[i:i + size] for i in range(0, len(doc), size))
+    assert out[0] == ("title", SCRIPT["title"])
+    assert [v for k, v in out if k == "line"] == SCRIPT["dialogue"]
+    assert out[-1] == ("done", SCRIPT)
+
+def test_script_events_dialogue_before_title():
+    doc = json.dumps({"notes": {"a": [1, 2]}, "dialogue": SCRIPT["dialogue"], "title": "Late"})
+    out = events(doc[i:i + 5] for i in range(0, len(doc), 5))
+    assert [v for k, v in out if k == "line"] == SCRIPT["dialogue"]
+    assert ("title", "Late") in out
+    assert out[-1][0] == "done"
+
+def test_script_events_lines_arrive_before_the_end():
+    doc = json.dumps(SCRIPT)
+    cut = doc.index("Caller")
+    gen = pp.iter_script_events(iter([doc[:cut], doc[cut:]]))
+    first = [next(gen) for _ in range(3)]
+    assert [k for k, _ in first] == ["title", "line", "line"]
+
+def test_script_events_skips_non_lines():
+    doc = '{"title": "T", "dialogue": [{"speaker": "Host 1"}, {"speaker": "Host 2", "text": "ok"}]}'
+    assert [v for k, v in events([doc]) if k == "line"] == [{"speaker": "Host 2", "text": "ok"}]
+
+def test_streamed_script_events():
+    llm = FakeLLM(lambda m: json.dumps(SCRIPT))
+    out = list(pp.iter_script_events(pp.stream_text(llm, "m", [{"role": "user", "content": "write"}])))
+    assert [v for k, v in out if k == "line"] == SCRIPT["dialogue"]
+    assert out[-1] == ("done", SCRIPT)
+
+# ================= LLM CACHE =================
+
+MESSAGES = [{"role": "user", "content": "outline this"}]
+
+def test_responses_are_cached(llm_cache):
+    llm = FakeLLM(lambda m: f"answer {len(llm.calls)}")
+    assert pp.chat_completion(llm, "m", MESSAGES) == "answer 1"
+    assert pp.chat_completion(llm, "m", MESSAGES) == "answer 1"
+    assert pp.chat_completion(llm, "other", MESSAGES) == "answer 2"
+    assert pp.chat_completion(llm, "m", MESSAGES, use_cache=False) == "answer 3"
+    assert pp.chat_completion(llm, "m", MESSAGES) == "answer 3"
+    assert len(list(llm_cache.glob("*.json"))) == 2
+
+def test_streamed_responses_are_cached():
+    llm = FakeLLM(lambda m: '{"title": "T"}')
+    assert "".join(pp.stream_text(llm, "m", MESSAGES)) == '{"title": "T"}'
+    assert list(pp.stream_text(llm, "m", MESSAGES)) == ['{"title": "T"}']
+    assert len(llm.calls) == 1
+
+@pytest.mark.parametrize("content, finish_reason", [('{"title": "T", "dia', "length"), ('{"title": "T"', "stop"), ('{"title": "T"}', "content_filter")])
+def test_incomplete_json_is_not_cached(content, finish_reason, llm_cache):
+    llm = FakeLLM(lambda m: content, finish_reason)
+    for _ in range(2):
+        try: pp.complete_json(llm, "m", MESSAGES)
+        except ValueError: pass
+        "".join(pp.stream_text(llm, "m", MESSAGES))
+    assert len(llm.calls) == 4
+    assert not list(llm_cache.glob("*"))
+
+def test_bad_cache_entries_are_evicted(llm_cache):
+    llm = FakeLLM(lambda m: '{"ok": true}')
+    path = pp.llm_cache_path(llm, "m", MESSAGES, True)
+    path.parent.mkdir(parents=True)
+    path.write_text('{"truncat', encoding="utf-8")
+    assert pp.complete_json(llm, "m", MESSAGES) == {"ok": True}
+    assert pp.complete_json(llm, "m", MESSAGES) == {"ok": True}
+    assert len(llm.calls) == 1
+
+def test_private_responses_are_not_cached(llm_cache):
+    llm = FakeLLM(lambda m: "secret")
+    with pp.private():
+        pp.chat_completion(llm, "m", MESSAGES)
+        "".join(pp.stream_text(llm, "m", MESSAGES, json_mode=False))
+    assert not llm_cache.exists()
+
+def test_client_cache_is_bounded():
+    assert pp.get_openai_client("key-a") is pp.get_openai_client("key-a")
+    assert pp.get_openai_client("key-a") is not pp.get_openai_client("key-b")
+    assert pp.get_openai_client.cache_info().maxsize == pp.CLIENT_CACHE_SIZE
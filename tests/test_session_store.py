@@ -0,0 +1,98 @@
+import os
+import sqlite3
+
+import pytest
+
+import session_store
+from session_store import SessionStore, SessionFull
+
+@pytest.fixture
+def store(tmp_path):
+    return SessionStore(tmp_path / "sessions.db")
+
+def test_round_trip_and_persistence(store, tmp_path):
+    script = {"title": "T", "dialogue": [{"speaker": "Host 1", "text": "héllo"}]}
+    store.put("s", "script_data", script)
+    store.put("s", "source_text", "word " * 10000)
+    assert store.get("s", "script_data") == script
+    fresh = SessionStore(tmp_path / "sessions.db")
+    assert fresh.exists("s")
+    assert fresh.get("s", "script_data") == script
+    assert fresh.get("s", "source_text") == "word " * 10000
+    assert fresh.get("s", "missing", []) == []
+    assert fresh.size("s") > 50000
+
+def test_values_are_compressed(store, tmp_path):
+    store.put("s", "source_text", "word " * 10000)
+    codec, raw, stored = sqlite3.connect(tmp_path / "sessions.db").execute("SELECT codec, raw_bytes, LENGTH(data) FROM artifacts").fetchone()
+    assert codec in ("zstd", "zlib")
+    assert stored < raw / 20
+
+def test_get_and_put_do_not_alias(store):
+    history = [{"role": "user", "content": "q"}]
+    store.put("s", "chat_history", history)
+    history.append({"role": "assistant", "content": "changed after put"})
+    loaded = store.get("s", "chat_history")
+    loaded.append({"role": "user", "content": "unsaved"})
+    assert store.get("s", "chat_history") == [{"role": "user", "content": "q"}]
+
+def test_session_limit(tmp_path):
+    store = SessionStore(tmp_path / "sessions.db", session_max_bytes=1000)
+    store.put("s", "a", "x" * 600)
+    with pytest.raises(SessionFull):
+        store.put("s", "b", "y" * 600)
+    assert store.get("s", "b") is None
+    store.put("s", "a", "z" * 900)  # replacing an artifact only counts it once
+    assert store.get("s", "a") == "z" * 900
+    with pytest.raises(ValueError):
+        store.put("t", "a", "x" * 2000)
+    assert not store.exists("t")
+
+def test_delete(store):
+    store.put("s", "a", 1)
+    store.put("s", "b", 2)
+    store.delete("s", ["a"])
+    assert store.get("s", "a") is None and store.get("s", "b") == 2
+    store.delete("s")
+    assert store.get("s", "b") is None and store.exists("s")
+
+def test_prune_expires_idle_sessions(store, tmp_path):
+    store.put("old", "a", "x")
+    store.put("new", "a", "y")
+    with sqlite3.connect(tmp_path / "sessions.db") as db: db.execute("UPDATE sessions SET touched = 0 WHERE id = 'old'")
+    store.prune()
+    assert not store.exists("old") and store.get("old", "a") is None
+    assert store.get("new", "a") == "y"
+
+def test_prune_keeps_store_under_its_size(tmp_path):
+    store = SessionStore(tmp_path / "sessions.db", store_max_bytes=30000)
+    for i in range(5):
+        store.put(f"s{i}", "a", os.urandom(6000).hex())
+    store.prune()
+    kept = [i for i in range(5) if store.exists(f"s{i}")]
+    assert kept and kept == list(range(5 - len(kept), 5))  # least recently used go first
+
+def test_prune_counts_expired_sessions_as_freed(tmp_path):
+    store = SessionStore(tmp_path / "sessions.db", store_max_bytes=30000)
+    store.put("idle", "a", os.urandom(20000).hex())
+    for i in range(3): store.put(f"s{i}", "a", os.urandom(2000).hex())
+    with sqlite3.connect(tmp_path / "sessions.db") as db: db.execute("UPDATE sessions SET touched = 0 WHERE id = 'idle'")
+    store.prune()
+    assert not store.exists("idle")
+    assert all(store.exists(f"s{i}") for i in range(3))
+
+def test_prune_runs_periodically(tmp_path, monkeypatch):
+    monkeypatch.setattr(session_store, "PRUNE_EVERY_PUTS", 3)
+    store = SessionStore(tmp_path / "sessions.db")
+    store.put("old", "a", 1)
+    with sqlite3.connect(tmp_path / "sessions.db") as db: db.execute("UPDATE sessions SET touched = 0 WHERE id = 'old'")
+    store.put("s", "a", 1)
+    assert store.exists("old")
+    store.put("s", "b", 1)
+    assert not store.exists("old")
+
+def test_hot_cache_is_bounded(tmp_path):
+    store = SessionStore(tmp_path / "sessions.db", hot_bytes=1000)
+    for i in range(10): store.put("s", f"k{i}", "x" * 300)
+    assert store.hot_size <= 1000
+    assert store.get("s", "k0") == "x" * 300
@@ -0,0 +1,76 @@
+import json
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import podcast_pipeline as pp
+
+def traced(work):
+    trace = pp.Trace("job")
+    with pp.tracing(trace): work()
+    return trace
+
+def by_name(trace): return {sp["name"]: sp for sp in trace.spans}
+
+def test_spans_nest_and_carry_args():
+    def work():
+        with pp.span("outer", "pipeline", files=2) as info:
+            info["bytes"] = 10
+            with pp.span("inner", "tts"): pp.note(retries=1)
+            pp.note(retries=2)
+    spans = by_name(traced(work))
+    assert spans["inner"]["parent"] == spans["outer"]["id"] and spans["outer"]["parent"] is None
+    assert spans["outer"]["args"] == {"files": 2, "bytes": 10, "retries": 2}
+    assert spans["inner"]["args"] == {"retries": 1}
+    assert spans["outer"]["start"] <= spans["inner"]["start"] <= spans["inner"]["end"] <= spans["outer"]["end"]
+
+def test_span_records_errors():
+    def work():
+        with pytest.raises(ValueError), pp.span("fails"): raise ValueError("boom")
+    assert traced(work).spans[0]["args"]["error"] == "ValueError: boom"
+
+def test_no_trace_is_a_no_op():
+    with pp.span("free") as info:
+        pp.note(retries=1)
+        assert info == {}
+
+def test_pool_work_joins_the_trace():
+    def work():
+        with pp.span("batch"), ThreadPoolExecutor(2) as pool:
+            def item(i):
+                with pp.span(f"item {i}", "tts"): pass
+            list(pool.map(pp.carry_context(item), range(3)))
+    spans = by_name(traced(work))
+    assert all(spans[f"item {i}"]["parent"] == spans["batch"]["id"] for i in range(3))
+
+def test_summary():
+    trace = pp.Trace("job")
+    for i, args in enumerate([{"cache": "hit", "bytes": 5}, {"cache": "miss", "bytes": 7, "retries": 1}, {"error": "X: y", "ok": True}]):
+        trace.add({"name": "tts", "cat": "tts", "start": i, "end": i + 0.5 * (i + 1), "thread": "t", "parent": None, "id": str(i), "args": args})
+    trace.add({"name": "mix", "cat": "mix", "start": 0, "end": 2, "thread": "t", "parent": None, "id": "m", "args": {}})
+    rows = {row["stage"]: row for row in trace.summary()}
+    assert rows["tts"] == {"category": "tts", "stage": "tts", "count": 3, "seconds": 3.0, "max_s": 1.5,
+                           "cache_hit": 1, "cache_miss": 1, "bytes": 12, "retries": 1, "errors": 1}
+    assert rows["mix"]["seconds"] == 2.0
+    assert json.loads(trace.to_json())["summary"] == trace.summary()
+
+def test_chrome_trace():
+    trace = pp.Trace("job")
+    trace.add({"name": "a", "cat": "tts", "start": 0.5, "end": 0.75, "thread": "main", "parent": None, "id": "1", "args": {"bytes": 3}})
+    trace.add({"name": "b", "cat": "llm", "start": 0.25, "end": 1.0, "thread": "pool-1", "parent": None, "id": "2", "args": {}})
+    events = json.loads(trace.to_chrome_trace())["traceEvents"]
+    assert events[0] == {"name": "process_name", "ph": "M", "pid": 1, "args": {"name": "job"}}
+    assert [(e["name"], e["ph"], e["ts"], e["dur"], e["tid"]) for e in events[1:]] == [("b", "X", 250000, 750000, 1), ("a", "X", 500000, 250000, 2)]
+    assert events[2]["args"] == {"bytes": 3}
+
+def test_streamed_span_has_its_parent():
+    llm = types.SimpleNamespace(base_url="fake")
+    chunk = lambda delta, finish: types.SimpleNamespace(choices=[types.SimpleNamespace(delta=types.SimpleNamespace(content=delta), finish_reason=finish)])
+    llm.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=lambda **kw: iter([chunk("hi", None), chunk(None, "stop")])))
+    def work():
+        with pp.private(), pp.span("script"):
+            assert "".join(pp.stream_text(llm, "m", [{"role": "user", "content": "q"}], json_mode=False)) == "hi"
+    spans = by_name(traced(work))
+    assert spans["stream_text"]["parent"] == spans["script"]["id"]
+    assert spans["stream_text"]["args"]["cache"] == "miss" and spans["stream_text"]["args"]["chars"] == 2
@@ -0,0 +1,44 @@
+import types
+
+import numpy as np
+
+import podcast_pipeline as pp
+
+RATE = pp.WHISPER_RATE
+
+def noise(seconds, seed=0):
+    return (np.random.default_rng(seed).standard_normal(int(seconds * RATE)) * 3000).astype(np.int16)
+
+def test_short_audio_is_one_chunk():
+    pcm = noise(5)
+    assert pp.find_split_points(pcm, chunk_seconds=10) == [0, len(pcm)]
+
+def test_chunks_fit_the_limit():
+    pcm = noise(95)
+    points = pp.find_split_points(pcm, chunk_seconds=10, search_seconds=3)
+    assert points[0] == 0 and points[-1] == len(pcm)
+    assert all(0 < b - a <= 10 * RATE for a, b in zip(points, points[1:]))
+
+def test_cuts_land_in_silence():
+    pcm = noise(25)
+    quiet = int(8.5 * RATE)
+    pcm[quiet:quiet + RATE // 10] = 0
+    points = pp.find_split_points(pcm, chunk_seconds=10, search_seconds=3)
+    assert quiet <= points[1] < quiet + RATE // 10
+
+class Busy(Exception):
+    status_code = 503
+    response = types.SimpleNamespace(headers={"retry-after": "0"})
+
+def test_transcribe_chunk_retries(tmp_path):
+    calls = []
+    def create(model, file):
+        calls.append(file.read())
+        if len(calls) == 1: raise Busy()
+        return types.SimpleNamespace(text="hello")
+    client = types.SimpleNamespace(audio=types.SimpleNamespace(transcriptions=types.SimpleNamespace(create=create)))
+    (tmp_path / "chunk.mp3").write_bytes(b"mp3")
+    with pp.tracing(pp.Trace("t")) as trace:
+        assert pp.transcribe_chunk(client, tmp_path / "chunk.mp3") == "hello"
+    assert calls == [b"mp3", b"mp3"]  # the file is reopened for every attempt
+    assert trace.spans[0]["args"]["retries"] == 1
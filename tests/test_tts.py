@@ -0,0 +1,120 @@
+import os
+import time
+import types
+
+import pytest
+
+import podcast_pipeline as pp
+
+# ================= LINE MERGING =================
+
+def test_merged_lines():
+    dialogue = [{"speaker": "Host 1", "text": " a "}, {"speaker": "Host 1", "text": "b"}, {"speaker": "Host 2", "text": "  "},
+                {"speaker": "Host 2", "text": "c"}, {"speaker": "Host 1", "text": "d"}]
+    assert pp.merge_dialogue_lines(dialogue) == [{"speaker": "Host 1", "text": "a b"}, {"speaker": "Host 2", "text": "c"},
+                                                 {"speaker": "Host 1", "text": "d"}]
+
+def test_merged_lines_respect_limit():
+    dialogue = [{"speaker": "Host 1", "text": "x" * 6}] * 3
+    assert [l["text"] for l in pp.merge_dialogue_lines(dialogue, max_chars=13)] == ["x" * 6 + " " + "x" * 6, "x" * 6]
+
+def test_merged_lines_do_not_mutate_input():
+    dialogue = [{"speaker": "Host 1", "text": "a"}, {"speaker": "Host 1", "text": "b"}]
+    pp.merge_dialogue_lines(dialogue)
+    assert dialogue[0]["text"] == "a"
+
+def test_merged_lines_are_lazy():
+    def stream():
+        yield {"speaker": "Host 1", "text": "a"}
+        yield {"speaker": "Host 2", "text": "b"}
+        raise RuntimeError("still writing")
+    gen = pp.iter_merged_lines(stream())
+    assert next(gen) == {"speaker": "Host 1", "text": "a"}
+
+# ================= RETRIES =================
+
+class Busy(Exception):
+    status_code = 429
+    response = types.SimpleNamespace(headers={"retry-after": "0"})
+
+class Denied(Exception):
+    status_code = 401
+
+def flaky(errors, result="ok"):
+    calls = []
+    def call():
+        calls.append(1)
+        if len(calls) <= len(errors): raise errors[len(calls) - 1]
+        return result
+    return call, calls
+
+def test_with_retries_retries_retryable_errors():
+    call, calls = flaky([Busy(), Busy()])
+    with pp.tracing(pp.Trace("t")), pp.span("call") as info:
+        assert pp.with_retries(call) == "ok"
+    assert len(calls) == 3 and info["retries"] == 2
+
+def test_with_retries_gives_up():
+    call, calls = flaky([Busy()] * 3)
+    with pytest.raises(Busy): pp.with_retries(call, retries=2)
+    assert len(calls) == 3
+    call, calls = flaky([Denied()])
+    with pytest.raises(Denied): pp.with_retries(call)
+    assert len(calls) == 1
+
+def test_generate_audio_reports_failure(tmp_path):
+    def create(**kwargs): raise Denied("bad key")
+    client = types.SimpleNamespace(audio=types.SimpleNamespace(speech=types.SimpleNamespace(create=create)))
+    assert pp.generate_audio_openai(client, "hi", "alloy", tmp_path / "a.mp3") is False
+
+# ================= SEGMENT CACHE =================
+
+def test_tts_cache_key():
+    key = pp.tts_cache_key("hello", "alloy")
+    assert key == pp.tts_cache_key("hello", "alloy")
+    variants = [pp.tts_cache_key("hello!", "alloy"), pp.tts_cache_key("hello", "nova"), pp.tts_cache_key("hello", "alloy", "tts-1-hd"),
+                pp.tts_cache_key("hello", "alloy", speed=1.1), pp.tts_cache_key("hello", "alloy", caller=True)]
+    assert len({key, *variants}) == 6
+    assert pp.cached_audio_path("hello", "alloy", cache_dir="c") == pp.Path("c") / f"{key}.mp3"
+
+def test_prune_cache_evicts_least_recently_used(tmp_path):
+    for i in range(5):
+        f = tmp_path / f"{i}.mp3"
+        f.write_bytes(b"x" * 100)
+        os.utime(f, (1000 + i, 1000 + i))
+    os.utime(tmp_path / "0.mp3")  # a hit refreshes it
+    (tmp_path / "other.txt").write_bytes(b"x" * 1000)
+    pp.prune_cache(tmp_path, 300)
+    assert sorted(f.name for f in tmp_path.iterdir()) == ["0.mp3", "3.mp3", "4.mp3", "other.txt"]
+    pp.prune_cache(tmp_path, 1000)
+    assert len(list(tmp_path.glob("*.mp3"))) == 3
+
+def test_write_atomic(tmp_path):
+    path = tmp_path / "sub" / "entry.mp3"
+    with pp.write_atomic(path) as tmp:
+        tmp.write_bytes(b"new")
+        assert not path.exists() and tmp.parent == path.parent
+    assert path.read_bytes() == b"new"
+    with pytest.raises(KeyboardInterrupt):
+        with pp.write_atomic(path) as tmp:
+            tmp.write_bytes(b"half")
+            raise KeyboardInterrupt
+    assert path.read_bytes() == b"new"
+    assert [f.name for f in path.parent.iterdir()] == ["entry.mp3"]
+
+def test_failed_tts_leaves_no_entry(tmp_path):
+    def create(**kwargs):
+        def stream_to_file(name):
+            open(name, "wb").write(b"partial")
+            raise Denied("dropped")
+        return types.SimpleNamespace(stream_to_file=stream_to_file)
+    client = types.SimpleNamespace(audio=types.SimpleNamespace(speech=types.SimpleNamespace(create=create)))
+    assert pp.generate_audio_cached(client, "hi", "alloy", tmp_path / "a.mp3") is False
+    assert not list(tmp_path.iterdir())
+
+def test_prune_cache_removes_stale_temp_files(tmp_path):
+    for name, age in [("a.mp3", 0), ("a.mp3.1.ff.part", 2 * pp.STALE_PART_SECONDS), ("b.mp3.1.ff.part", 10)]:
+        (tmp_path / name).write_bytes(b"x")
+        os.utime(tmp_path / name, (time.time() - age,) * 2)
+    pp.prune_cache(tmp_path, 10 ** 9)
+    assert sorted(f.name for f in tmp_path.iterdir()) == ["a.mp3", "b.mp3.1.ff.part"]  # b may still be being written
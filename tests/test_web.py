@@ -0,0 +1,77 @@
+import types
+
+import pytest
+
+import podcast_pipeline as pp
+
+def test_feed_links_rss():
+    rss = b"""<?xml version="1.0"?><rss><channel><item><link>https://a/1</link></item><item><link> https://a/2 </link></item></channel></rss>"""
+    assert pp.feed_links(rss) == ["https://a/1", "https://a/2"]
+
+def test_feed_links_atom():
+    atom = b"""<feed xmlns="http://www.w3.org/2005/Atom"><entry><link href="https://a/1"/><link rel="edit" href="https://a/e"/></entry>
+               <entry><link rel="alternate" href="https://a/2"/></entry></feed>"""
+    assert pp.feed_links(atom) == ["https://a/1", "https://a/2"]
+
+def test_feed_links_sitemaps():
+    ns = 'xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"'
+    urlset = f'<?xml version="1.0"?><urlset {ns}><url><loc>https://a/1</loc></url><url><loc>https://a/2</loc></url></urlset>'.encode()
+    index = f'<sitemapindex {ns}><sitemap><loc>https://a/s1.xml</loc></sitemap></sitemapindex>'.encode()
+    assert pp.feed_links(urlset) == ["https://a/1", "https://a/2"]
+    assert pp.feed_links(index) == ("sitemapindex", ["https://a/s1.xml"])
+
+@pytest.mark.parametrize("data", [b"<html><body><p>hi</p></body></html>", b"<?xml version='1.0'?><rss><broken>", b"plain text"])
+def test_feed_links_not_a_feed(data):
+    assert pp.feed_links(data) is None
+
+PARA = "<p>" + "The council approved the budget, which raises spending on schools, parks and roads. " * 3 + "</p>"
+
+def test_main_content_picks_the_article():
+    html = f"""<html><head><title>Site | Story</title><meta property="og:title" content="The Story"></head><body>
+        <nav><p>{'Home, News, Sport, Weather, Culture, Travel. ' * 3}</p></nav>
+        <div class="links"><p><a href="/1">{'A related story about something else entirely, ' * 2}</a></p></div>
+        <article><h1>Budget passes</h1>{PARA * 3}<ul><li>Schools first</li></ul></article>
+        <footer><p>Copyright, all rights reserved, 2024, terms and conditions apply.</p></footer></body></html>"""
+    article = pp.main_content(pp.html_soup(html))
+    assert article["title"] == "The Story"
+    assert article["text"].startswith("Budget passes\n\nThe council approved")
+    assert "Schools first" in article["text"]
+    assert "Home, News" not in article["text"] and "Copyright" not in article["text"] and "related story" not in article["text"]
+
+def test_main_content_keeps_page_wide_forms():
+    html = f"""<html><body><form id="aspnetForm">{PARA * 4}<form><input name="q"><button>Search</button> Search the site</form></form></body></html>"""
+    text = pp.main_content(pp.html_soup(html))["text"]
+    assert text.count("The council approved") == 12
+    assert "Search" not in text
+
+class FakeSession:
+    """Serves body with an ETag, and 304 to requests that send it back."""
+    def __init__(self, body=b"<html>page</html>", etag='"v1"'):
+        self.body, self.etag, self.requests = body, etag, []
+
+    def get(self, url, timeout, headers):
+        self.requests.append(headers)
+        if self.etag and headers.get("If-None-Match") == self.etag:
+            return types.SimpleNamespace(status_code=304, content=b"", headers={})
+        return types.SimpleNamespace(status_code=200, content=self.body, raise_for_status=lambda: None,
+                                     headers={"ETag": self.etag, "Content-Type": "text/html"} if self.etag else {"Content-Type": "text/html"})
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    fake = FakeSession()
+    monkeypatch.setattr(pp, "WEB_CACHE_DIR", tmp_path / "web")
+    monkeypatch.setattr(pp, "get_http_session", lambda: fake)
+    return fake
+
+def test_fetch_cached_revalidates(session):
+    assert pp.fetch_cached("https://a/1") == (b"<html>page</html>", "text/html")
+    assert pp.fetch_cached("https://a/1") == (b"<html>page</html>", "text/html")
+    assert session.requests == [{}, {"If-None-Match": '"v1"'}]
+
+def test_fetch_cached_skips_uncacheable_and_private(session, tmp_path):
+    with pp.private(): pp.fetch_cached("https://a/1")
+    assert not (tmp_path / "web").exists()
+    session.etag = None
+    pp.fetch_cached("https://a/2")
+    pp.fetch_cached("https://a/2")
+    assert session.requests == [{}, {}, {}] and not (tmp_path / "web").exists()